@@ -97,7 +97,9 @@ async def _create_user_part_1_new(
             return {"result": "user already exists"}
 
         logger.info(
-            f"Пользователь {tg_user_id} зарегистрировался. Логин и пароль: {all([login, password])}"
+            "Пользователь %s зарегистрировался. Логин и пароль: %s",
+            tg_user_id,
+            bool(login and password),
         )
 
         if not login or not password:
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 from dataclasses import dataclass
@@ -157,19 +158,20 @@ async def complete_email_code_login(
     cookies = result[0]
     await db.create_cookie(tg_user_id, json.dumps(cookies))
 
-    # Получаем FIO пользователя и сохраняем в БД
-    try:
-        me_info = await get_me_info.get_me_info_full(
-            cookies, tg_user_id, db, user_agent=user_agent
-        )
-        fio = me_info.get("fio", "")
-        if fio:
-            await db.update_fio(tg_user_id, fio)
-            logger.info(f"Saved FIO for user {tg_user_id}: {fio}")
-    except Exception as e:
-        logger.error(f"Error getting FIO after email code for {tg_user_id}: {e}")
+    async def _save_fio() -> None:
+        # Получаем FIO пользователя и сохраняем в БД
+        try:
+            me_info = await get_me_info.get_me_info_full(
+                cookies, tg_user_id, db, user_agent=user_agent
+            )
+            fio = me_info.fio
+            if fio:
+                await db.update_fio(tg_user_id, fio)
+                logger.info(f"Saved FIO for user {tg_user_id}: {fio}")
+        except Exception as e:
+            logger.error(f"Error getting FIO after email code for {tg_user_id}: {e}")
 
-    if source == "login":
+    async def _save_groups() -> List[str]:
         # Получаем группы
         try:
             groups = await get_groups.get_group(
@@ -185,6 +187,12 @@ async def complete_email_code_login(
             logger.error(f"Error getting groups after email code for {tg_user_id}: {e}")
             return []
 
+    if source == "login":
+        # Запросы независимы: выполняем их параллельно, а не друг за другом
+        _, groups = await asyncio.gather(_save_fio(), _save_groups())
+        return groups
+
+    await _save_fio()
     return []
 
 
@@ -638,7 +646,7 @@ async def _get_user_schedule(
     db: DBModel,
     tgID: int = None,
     tg_user_id: int = None,
-    b64_data: str = None,
+    b64_data: Union[str, bytes] = None,
     user_agent=None,
 ):
     """
@@ -648,11 +656,11 @@ async def _get_user_schedule(
         db: Экземпляр DBModel для работы с базой данных
         tgID: Telegram ID пользователя (deprecated, используйте tg_user_id)
         tg_user_id: Telegram ID пользователя
-        b64_data: Base64 закодированные данные для получения расписания
+        b64_data: gRPC-Web фрейм запроса расписания (bytes или base64-строка)
         user_agent: User agent для HTTP запросов (опционально)
 
     Returns:
-        Данные расписания пользователя
+        Бинарный ответ API расписания (gRPC-Web фрейм)
 
     Raises:
         EmailCodeRequiredError: Если требуется ввод кода из email
@@ -14,6 +14,7 @@ from backend.external_auth_endpoint_v1.views import router as external_auth_rout
 from backend.group_endpoint_v1.views import router as group_router
 from backend.markin_endpoint_v1.views import router as markin_router
 from backend.middleware import RateLimitMiddleware
+from backend.mirea_api.http_session import close_session as close_mirea_session
 from backend.nfc_endpoint_v1.views import router as nfc_router
 from backend.points_endpoint_v1.views import router as points_router
 from backend.redis_client import redis_client
@@ -97,6 +98,7 @@ async def lifespan(app: FastAPI):
     yield
 
     # Cleanup on shutdown
+    await close_mirea_session()
     await redis_client.disconnect()
     await db.disconnect()
 
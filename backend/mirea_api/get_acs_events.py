@@ -17,17 +17,20 @@ from backend.database import DBModel
 from backend.mirea_api.protobuf_decoder import (
     ACS_EVENTS_TYPEDEF,
     MOSCOW_TZ,
-    decode_grpc_response_bytes,
+    decode_grpc_response_bytes_fast,
     ensure_list,
     get_field,
     get_nested,
     timestamp_to_datetime,
 )
 
-from .get_cookies import generate_random_mobile_user_agent
+from .get_cookies import get_user_agent
 
 logger = logging.getLogger(__name__)
 
+# UUID в ответе GetMeInfo (ASCII, нижний регистр)
+_UUID_RE = re.compile(rb"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
 
 def parse_acs_events(grpc_response_bytes: bytes) -> List[Dict[str, Any]]:
     """
@@ -46,7 +49,7 @@ def parse_acs_events(grpc_response_bytes: bytes) -> List[Dict[str, Any]]:
     Returns:
         Список словарей с событиями ACS
     """
-    message = decode_grpc_response_bytes(grpc_response_bytes, ACS_EVENTS_TYPEDEF)
+    message = decode_grpc_response_bytes_fast(grpc_response_bytes, ACS_EVENTS_TYPEDEF)
 
     if not message:
         logger.debug("Пустой ответ от ACS API")
@@ -73,9 +76,11 @@ def parse_acs_events(grpc_response_bytes: bytes) -> List[Dict[str, Any]]:
             if ts and isinstance(ts, int):
                 dt = timestamp_to_datetime(ts)
                 if dt:
-                    event["timestamp"] = dt.strftime("%Y-%m-%d %H:%M:%S")
-                    event["date"] = dt.strftime("%Y-%m-%d")
-                    event["time"] = dt.strftime("%H:%M:%S")
+                    # Дата и время - срезы одной отформатированной строки
+                    timestamp = dt.strftime("%Y-%m-%d %H:%M:%S")
+                    event["timestamp"] = timestamp
+                    event["date"] = timestamp[:10]
+                    event["time"] = timestamp[11:]
 
         # Field 3: access_point_from
         from_data = item.get("3", {})
@@ -199,7 +204,7 @@ async def get_user_uuid(
             "User-Agent": (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             ),
         }
 
@@ -217,13 +222,11 @@ async def get_user_uuid(
                     raise Exception(f"Ошибка запроса к {url}. Код: {response.status}")
                 content = await response.read()
 
-        # Убираем gRPC заголовок
-        if len(content) > 5 and content[0] == 0x00:
-            content = content[5:]
+        # gRPC заголовок пропускаем позицией поиска, без копирования ответа
+        start = 5 if len(content) > 5 and content[0] == 0x00 else 0
 
         # Ищем UUID (первый UUID в ответе - это UUID пользователя)
-        uuid_pattern = rb"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
-        match = re.search(uuid_pattern, content)
+        match = _UUID_RE.search(content, start)
         if match:
             return match.group().decode("ascii")
 
@@ -278,7 +281,7 @@ async def get_acs_events_for_date(
             "User-Agent": (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             ),
         }
 
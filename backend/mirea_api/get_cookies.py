@@ -1,19 +1,61 @@
+import asyncio
+import codecs
 import logging
 import random
 import re
 from dataclasses import dataclass
-from typing import Optional, Union
-from urllib.parse import urlparse
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urlparse
 
 import aiohttp
 from bs4 import BeautifulSoup
 
 from backend.database import DBModel
 
+from .http_session import get_connector
+
 logger = logging.getLogger(__name__)
 
 COOKIE_FILENAME = "cookies.json"
 
+# Максимум одновременных авторизаций в Keycloak при пакетном получении cookies
+MAX_CONCURRENT_LOGINS = 20
+
+# Маркеры страницы ввода email кода (один проход регулярным выражением)
+_EMAIL_CODE_PAGE_RE = re.compile(
+    rb'"email-code-form"|"emailCode"|name="emailCode"|email-authenticator'
+)
+
+# Признак ошибки на странице Keycloak (поиск без копии тела в нижнем регистре)
+_ERROR_RE = re.compile(rb"error", re.IGNORECASE)
+
+# URL формы из kcContext Keycloak (React-страница логина)
+_LOGIN_ACTION_RE = re.compile(r'"loginAction":\s*"([^"]*)"')
+
+# Тело формы пропуска required-action. Keycloak ожидает
+# application/x-www-form-urlencoded, строка нужна для дублирующихся ключей skip
+_SKIP_FORM_BODY = urlencode([("skip", "Пропустить"), ("skip", "true"), ("retry", "")])
+
+# Неизменная часть тела формы отправки email кода
+_EMAIL_CODE_FORM_SUFFIX = "&login=true"
+
+# Статические заголовки для первичного GET на страницу логина
+_INITIAL_HEADERS_BASE = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+# Статические заголовки для POST формы логина в Keycloak
+_LOGIN_HEADERS_BASE = {
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+}
+
 
 @dataclass
 class EmailCodeRequired:
@@ -122,6 +164,30 @@ def generate_random_mobile_user_agent() -> str:
     return ua
 
 
+@lru_cache(maxsize=10_000)
+def _cached_user_agent(tg_user_id: int) -> str:
+    """Закреплённый за пользователем случайный User-Agent."""
+    return generate_random_mobile_user_agent()
+
+
+def get_user_agent(tg_user_id: Optional[int] = None) -> str:
+    """
+    Возвращает User-Agent пользователя, сгенерированный один раз на tg_user_id.
+
+    Один и тот же UA на все запросы пользователя не плодит новые «устройства»
+    на стороне MIREA. Без tg_user_id UA генерируется заново.
+
+    Аргументы:
+    tg_user_id (int): Telegram ID пользователя.
+
+    Возвращает:
+    str: Строка User-Agent для мобильного браузера.
+    """
+    if tg_user_id is None:
+        return generate_random_mobile_user_agent()
+    return _cached_user_agent(tg_user_id)
+
+
 def _extract_session_cookies(session) -> dict:
     """Извлекает cookies из сессии в виде словаря."""
     cookies = {}
@@ -153,14 +219,25 @@ def _extract_cookies_list(session) -> list:
     return cookies
 
 
-def _is_email_code_page(page_text: str) -> bool:
+def _find_login_action(page_text: str) -> Optional[str]:
+    """Извлекает и декодирует loginAction из kcContext, если он есть на странице."""
+    # Дешёвая проверка подстрокой, чтобы не запускать regex на страницах без kcContext
+    if '"loginAction"' not in page_text:
+        return None
+    login_action_match = _LOGIN_ACTION_RE.search(page_text)
+    if not login_action_match:
+        return None
+    return codecs.decode(login_action_match.group(1), "unicode-escape")
+
+
+def _decode_page(page_bytes: bytes) -> str:
+    """Декодирует тело страницы Keycloak в строку (только когда текст нужен)."""
+    return page_bytes.decode("utf-8", "replace")
+
+
+def _is_email_code_page(page_bytes: bytes) -> bool:
     """Проверяет, является ли страница формой ввода email кода."""
-    return (
-        '"email-code-form"' in page_text
-        or '"emailCode"' in page_text
-        or 'name="emailCode"' in page_text
-        or "email-authenticator" in page_text
-    )
+    return _EMAIL_CODE_PAGE_RE.search(page_bytes) is not None
 
 
 def _extract_email_code_form_url(page_text: str, current_url: str) -> Optional[str]:
@@ -168,9 +245,8 @@ def _extract_email_code_form_url(page_text: str, current_url: str) -> Optional[s
     logger.info(f"Extracting email code form URL, page length: {len(page_text)}")
 
     # Способ 1: loginAction в kcContext
-    login_action_match = re.search(r'"loginAction":\s*"([^"]*)"', page_text)
-    if login_action_match:
-        url = login_action_match.group(1).encode().decode("unicode-escape")
+    url = _find_login_action(page_text)
+    if url:
         logger.info(f"Found email code loginAction URL: {url}")
         return url
 
@@ -189,21 +265,20 @@ def _extract_email_code_form_url(page_text: str, current_url: str) -> Optional[s
     return None
 
 
-def _is_max_account_config_page(page_text: str) -> bool:
+def _is_max_account_config_page(page_bytes: bytes) -> bool:
     """Проверяет, является ли страница предложением привязать Max (required-action)."""
     return (
-        '"login-max-otp"' in page_text
-        or "max-account-config" in page_text
-        or ('"showSkip"' in page_text and '"login-max-otp' in page_text)
+        b'"login-max-otp"' in page_bytes
+        or b"max-account-config" in page_bytes
+        or (b'"showSkip"' in page_bytes and b'"login-max-otp' in page_bytes)
     )
 
 
 def _extract_skip_action_url(page_text: str, current_url: str) -> Optional[str]:
     """Извлекает URL для пропуска required-action (кнопка Пропустить)."""
     # Ищем loginAction в kcContext
-    login_action_match = re.search(r'"loginAction":\s*"([^"]*)"', page_text)
-    if login_action_match:
-        url = login_action_match.group(1).encode().decode("unicode-escape")
+    url = _find_login_action(page_text)
+    if url:
         logger.info(f"Found skip action URL: {url}")
         return url
 
@@ -225,11 +300,11 @@ async def _skip_required_action(
     skip_url: str,
     user_agent: str,
     tg_user_id: int = None,
-) -> Optional[str]:
+) -> Tuple[str, int, bytes]:
     """
     Автоматически пропускает required-action (например, max-account-config).
     Отправляет POST с skip=true.
-    Возвращает финальный URL после редиректа или None при ошибке.
+    Возвращает финальный URL после редиректа, статус и тело ответа (bytes).
     """
     logger.info(f"Пропуск required-action для пользователя {tg_user_id}: {skip_url}")
 
@@ -240,22 +315,17 @@ async def _skip_required_action(
         "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
     }
 
-    # Keycloak ожидает application/x-www-form-urlencoded (не multipart)
-    # Используем строку для поддержки дублирующихся ключей (skip)
-    from urllib.parse import urlencode
-    skip_data = urlencode([("skip", "Пропустить"), ("skip", "true"), ("retry", "")])
-
     result_status = None
     async with session.post(
         skip_url,
-        data=skip_data,
+        data=_SKIP_FORM_BODY,
         headers=headers,
         allow_redirects=True,
         timeout=aiohttp.ClientTimeout(total=15),
     ) as response:
         final_url = str(response.url)
         result_status = response.status
-        response_text = await response.text()
+        response_bytes = await response.read()
         logger.info(
             f"Skip required-action ответ: статус={response.status}, URL={final_url}"
         )
@@ -264,7 +334,7 @@ async def _skip_required_action(
     # OIDC callback формы (Keycloak может вернуть HTML с auto-submit формой
     # вместо 302 редиректа)
     if "attendance-app.mirea.ru" not in final_url:
-        soup = BeautifulSoup(response_text, "html.parser")
+        soup = BeautifulSoup(_decode_page(response_bytes), "html.parser")
         form = soup.find("form")
         if form and form.get("action"):
             form_action = form["action"].replace("&amp;", "&")
@@ -292,12 +362,12 @@ async def _skip_required_action(
             ) as cb_resp:
                 final_url = str(cb_resp.url)
                 result_status = cb_resp.status
-                response_text = await cb_resp.text()
+                response_bytes = await cb_resp.read()
                 logger.info(
                     f"Форма после skip ответ: статус={cb_resp.status}, URL={final_url}"
                 )
 
-    return final_url, result_status, response_text
+    return final_url, result_status, response_bytes
 
 
 async def get_cookies(
@@ -324,7 +394,13 @@ async def get_cookies(
     """
     logger.info(f"Получаю новые куки для пользователя {tg_user_id}")
     try:
-        async with aiohttp.ClientSession() as session:
+        # Свой CookieJar на каждую авторизацию, но общий пул соединений:
+        # параллельные входы (get_cookies_many) не делают новый TLS-хэндшейк
+        async with aiohttp.ClientSession(
+            cookie_jar=aiohttp.CookieJar(),
+            connector=get_connector(),
+            connector_owner=False,
+        ) as session:
             # 1. Получаем страницу авторизации (будет редирект на Keycloak SSO)
             initial_url = (
                 "https://attendance.mirea.ru/api/auth/login"
@@ -336,16 +412,9 @@ async def get_cookies(
             random_mobile_ua = (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             )
-            initial_headers = {
-                "User-Agent": random_mobile_ua,
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
-                "Accept-Encoding": "gzip, deflate, br",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1",
-            }
+            initial_headers = _INITIAL_HEADERS_BASE | {"User-Agent": random_mobile_ua}
 
             logger.info("Переход на страницу логина...")
             async with session.get(
@@ -364,10 +433,14 @@ async def get_cookies(
 
                 page_text = await response.text()
 
+            # Origin страницы Keycloak (нужен для заголовка и относительного action)
+            parsed_url = urlparse(final_url)
+            origin = f"{parsed_url.scheme}://{parsed_url.netloc}"
+
             # 2. Извлекаем loginAction из Keycloak (используется для React-формы)
             # Keycloak использует React, ищем loginAction в JavaScript
-            login_action_match = re.search(r'"loginAction":\s*"([^"]*)"', page_text)
-            if not login_action_match:
+            form_action = _find_login_action(page_text)
+            if not form_action:
                 logger.warning("Не найден loginAction, пробуем альтернативный метод")
                 # Пробуем найти форму
                 soup = BeautifulSoup(page_text, "html.parser")
@@ -375,18 +448,11 @@ async def get_cookies(
                 if form and form.get("action"):
                     form_action = form["action"].replace("&amp;", "&")
                     if not form_action.startswith("http"):
-                        parsed_url = urlparse(final_url)
-                        form_action = (
-                            f"{parsed_url.scheme}://{parsed_url.netloc}{form_action}"
-                        )
+                        form_action = f"{origin}{form_action}"
                 else:
                     raise Exception(
                         "Не удалось найти форму авторизации на странице Keycloak"
                     )
-            else:
-                form_action = login_action_match.group(1)
-                # Декодируем unicode escape sequences
-                form_action = form_action.encode().decode("unicode-escape")
 
             logger.info(f"URL для авторизации: {form_action}")
 
@@ -397,13 +463,10 @@ async def get_cookies(
                 "credentialId": "",
             }
 
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded",
+            headers = _LOGIN_HEADERS_BASE | {
                 "Referer": final_url,
-                "Origin": f"{urlparse(final_url).scheme}://{urlparse(final_url).netloc}",
+                "Origin": origin,
                 "User-Agent": random_mobile_ua,
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
             }
 
             logger.info("Отправка данных авторизации...")
@@ -415,7 +478,8 @@ async def get_cookies(
                 timeout=aiohttp.ClientTimeout(total=15),
             ) as post_response:
                 final_redirect_url = str(post_response.url)
-                response_text = await post_response.text()
+                # Тело читаем как bytes: при успешном входе оно не декодируется вовсе
+                response_bytes = await post_response.read()
                 logger.info(
                     f"Статус: {post_response.status}, Конечный URL: {final_redirect_url}"
                 )
@@ -426,17 +490,19 @@ async def get_cookies(
                 # на _is_email_code_page и вызывает ненужный email code цикл.
 
                 # Проверяем, не попали ли на страницу max-account-config (предложение привязать Max)
-                if post_response.status == 200 and _is_max_account_config_page(response_text):
+                if post_response.status == 200 and _is_max_account_config_page(response_bytes):
                     logger.info(
                         f"Обнаружена страница max-account-config для пользователя {tg_user_id}, пропускаем"
                     )
-                    skip_url = _extract_skip_action_url(response_text, final_redirect_url)
+                    skip_url = _extract_skip_action_url(
+                        _decode_page(response_bytes), final_redirect_url
+                    )
                     if skip_url:
-                        final_redirect_url, skip_status, response_text = await _skip_required_action(
+                        final_redirect_url, skip_status, response_bytes = await _skip_required_action(
                             session, skip_url, random_mobile_ua, tg_user_id
                         )
                         # После пропуска может быть ещё одна required-action или успех
-                        if _is_max_account_config_page(response_text):
+                        if _is_max_account_config_page(response_bytes):
                             raise Exception("Не удалось пропустить настройку Max")
                     else:
                         raise Exception(
@@ -444,12 +510,12 @@ async def get_cookies(
                         )
 
                 # Проверяем, не требуется ли ввод email кода
-                if post_response.status == 200 and _is_email_code_page(response_text):
+                if post_response.status == 200 and _is_email_code_page(response_bytes):
                     logger.info(
                         f"Обнаружена страница email кода для пользователя {tg_user_id}"
                     )
                     email_action_url = _extract_email_code_form_url(
-                        response_text, final_redirect_url
+                        _decode_page(response_bytes), final_redirect_url
                     )
                     if email_action_url:
                         session_cookies = _extract_session_cookies(session)
@@ -469,7 +535,7 @@ async def get_cookies(
                 # Проверяем, что мы попали на attendance-app
                 if (
                     "attendance-app.mirea.ru" not in final_redirect_url
-                    and "error" in response_text.lower()
+                    and _ERROR_RE.search(response_bytes) is not None
                 ):
                     raise Exception("Неправильный логин или пароль")
 
@@ -526,6 +592,42 @@ async def get_cookies(
         raise Exception(f"Ошибка при получении cookies: {str(e)}")
 
 
+async def get_cookies_many(
+    credentials: Iterable[Tuple[str, str, Optional[str], Optional[int]]],
+    db: DBModel = None,
+    max_concurrency: int = MAX_CONCURRENT_LOGINS,
+) -> List[Union[list, EmailCodeRequired, BaseException]]:
+    """
+    Получает cookies для нескольких пользователей конкурентно.
+
+    Число одновременных авторизаций ограничено семафором, чтобы не упереться
+    в лимиты Keycloak. Ошибка одного пользователя не прерывает остальных.
+
+    Аргументы:
+    credentials: Кортежи (логин, пароль, user_agent, tg_user_id).
+    db (DBModel): Объект базы данных.
+    max_concurrency (int): Максимум одновременных авторизаций.
+
+    Возвращает:
+    list: Результаты get_cookies в порядке credentials; исключения
+    возвращаются как элементы списка.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _login_one(
+        user_login: str,
+        password: str,
+        user_agent: Optional[str],
+        tg_user_id: Optional[int],
+    ) -> Union[list, EmailCodeRequired]:
+        async with semaphore:
+            return await get_cookies(user_login, password, user_agent, tg_user_id, db)
+
+    return await asyncio.gather(
+        *(_login_one(*creds) for creds in credentials), return_exceptions=True
+    )
+
+
 async def submit_email_code(
     email_code: str,
     email_code_action_url: str,
@@ -552,7 +654,9 @@ async def submit_email_code(
     try:
         jar = aiohttp.CookieJar()
 
-        async with aiohttp.ClientSession(cookie_jar=jar) as session:
+        async with aiohttp.ClientSession(
+            cookie_jar=jar, connector=get_connector(), connector_owner=False
+        ) as session:
             # Восстанавливаем cookies в сессию
             for name, cookie_data in session_cookies.items():
                 domain = cookie_data.get("domain", "sso.mirea.ru")
@@ -569,7 +673,7 @@ async def submit_email_code(
             random_mobile_ua = (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             )
 
             headers = {
@@ -579,10 +683,8 @@ async def submit_email_code(
                 "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
             }
 
-            email_data = {
-                "emailCode": email_code,
-                "login": "true",
-            }
+            # Готовое urlencoded тело вместо словаря, который aiohttp кодирует сам
+            email_data = urlencode({"emailCode": email_code}) + _EMAIL_CODE_FORM_SUFFIX
 
             logger.info(f"Отправка email кода на URL: {email_code_action_url}")
 
@@ -594,7 +696,7 @@ async def submit_email_code(
                 timeout=aiohttp.ClientTimeout(total=15),
             ) as response:
                 final_url = str(response.url)
-                response_text = await response.text()
+                response_bytes = await response.read()
                 logger.info(
                     f"Email код ответ: статус={response.status}, URL={final_url}"
                 )
@@ -605,17 +707,19 @@ async def submit_email_code(
                 # на _is_email_code_page и вызывает бесконечный цикл.
 
                 # Проверяем, не попали ли на страницу max-account-config (предложение привязать Max)
-                if response.status == 200 and _is_max_account_config_page(response_text):
+                if response.status == 200 and _is_max_account_config_page(response_bytes):
                     logger.info(
                         f"После email кода обнаружена страница max-account-config для {tg_user_id}, пропускаем"
                     )
-                    skip_url = _extract_skip_action_url(response_text, final_url)
+                    skip_url = _extract_skip_action_url(
+                        _decode_page(response_bytes), final_url
+                    )
                     if skip_url:
-                        final_url, skip_status, response_text = await _skip_required_action(
+                        final_url, skip_status, response_bytes = await _skip_required_action(
                             session, skip_url, random_mobile_ua, tg_user_id
                         )
                         # После пропуска — проверяем результат
-                        if _is_max_account_config_page(response_text):
+                        if _is_max_account_config_page(response_bytes):
                             raise Exception("Не удалось пропустить настройку Max")
 
                         # Проверяем наличие .AspNetCore.Cookies
@@ -660,12 +764,12 @@ async def submit_email_code(
                         )
 
                 # Если снова страница email кода — неверный код
-                if response.status == 200 and _is_email_code_page(response_text):
+                if response.status == 200 and _is_email_code_page(response_bytes):
                     logger.warning(
                         f"Неверный email код для пользователя {tg_user_id}"
                     )
                     new_action_url = _extract_email_code_form_url(
-                        response_text, final_url
+                        _decode_page(response_bytes), final_url
                     )
                     if new_action_url:
                         new_session_cookies = _extract_session_cookies(session)
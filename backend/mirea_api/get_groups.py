@@ -7,12 +7,14 @@
 
 import logging
 import re
+from functools import lru_cache
+from operator import itemgetter
 from typing import Any, Dict, List, Optional
 
 import aiohttp
 
 from backend.database import DBModel
-from backend.mirea_api.get_cookies import generate_random_mobile_user_agent
+from backend.mirea_api.get_cookies import get_user_agent
 from backend.mirea_api.protobuf_decoder import (
     VISITING_LOGS_TYPEDEF,
     decode_grpc_response_bytes,
@@ -26,6 +28,26 @@ logger = logging.getLogger(__name__)
 # Паттерн для названия группы: 4 русские буквы, тире, 2 цифры, тире, 2 цифры
 GROUP_PATTERN = re.compile(r"[А-ЯЁа-яё]{4}-\d{2}-\d{2}")
 
+# Извлекает пару (name, value) из словаря куки
+_COOKIE_NAME_VALUE = itemgetter("name", "value")
+
+# Статические заголовки gRPC-Web запроса (User-Agent добавляется на каждый вызов)
+_GRPC_HEADERS_BASE = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Content-Type": "application/grpc-web+proto",
+    "pulse-app-type": "pulse-app",
+    "pulse-app-version": "1.6.0+5256",
+    "Origin": "https://attendance-app.mirea.ru",
+    "Referer": "https://attendance-app.mirea.ru/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+    "x-grpc-web": "1",
+    "x-requested-with": "XMLHttpRequest",
+}
+
 
 def parse_visiting_logs(message: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -118,28 +140,15 @@ async def _query_get_group(
         Exception: При ошибках запроса
     """
     try:
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
+        cookies_dict = dict(map(_COOKIE_NAME_VALUE, cookies))
 
         url = "https://attendance.mirea.ru/rtu_tc.attendance.api.VisitingLogService/GetAvailableVisitingLogsOfStudent"
-        headers = {
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
-            "Content-Type": "application/grpc-web+proto",
-            "pulse-app-type": "pulse-app",
-            "pulse-app-version": "1.6.0+5256",
-            "Origin": "https://attendance-app.mirea.ru",
-            "Referer": "https://attendance-app.mirea.ru/",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-site",
+        headers = _GRPC_HEADERS_BASE | {
             "User-Agent": (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             ),
-            "x-grpc-web": "1",
-            "x-requested-with": "XMLHttpRequest",
         }
 
         # Пустое тело запроса (gRPC frame: 5 байт нулей)
@@ -166,6 +175,7 @@ async def _query_get_group(
         raise
 
 
+@lru_cache(maxsize=128)
 def _semester_sort_key(semester_name: str) -> tuple:
     """
     Возвращает ключ сортировки для названия семестра.
@@ -215,21 +225,20 @@ async def get_group(
         message = await _query_get_group(cookies, tg_user_id, db, user_agent)
         logs = parse_visiting_logs(message)
 
-        # Сортируем логи по семестру от старого к новому
-        logs.sort(key=lambda log: _semester_sort_key(log.get("semester_name", "")))
-
-        # Извлекаем уникальные группы в порядке от старых к новым семестрам
-        # Так groups[-1] будет группой из актуального семестра
-        groups = []
-        seen = set()
-        for log in logs:
+        # Для каждой группы запоминаем самый новый семестр, в котором она встречается.
+        # Индекс лога разрешает равенство семестров так же, как стабильная сортировка.
+        latest = {}
+        for index, log in enumerate(logs):
             group_name = log.get("group_name", "")
-            if group_name and GROUP_PATTERN.match(group_name):
-                if group_name in seen:
-                    # Если группа уже есть — переставляем её в конец (более новый семестр)
-                    groups.remove(group_name)
-                groups.append(group_name)
-                seen.add(group_name)
+            if not (group_name and GROUP_PATTERN.match(group_name)):
+                continue
+            key = (_semester_sort_key(log.get("semester_name", "")), index)
+            if group_name not in latest or key > latest[group_name]:
+                latest[group_name] = key
+
+        # Уникальные группы в порядке от старых к новым семестрам,
+        # так groups[-1] будет группой из актуального семестра
+        groups = sorted(latest, key=latest.__getitem__)
 
         logger.debug(f"Группы пользователя {tg_user_id} (от старых к новым): {groups}")
         return [groups]
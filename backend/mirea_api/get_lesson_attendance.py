@@ -3,28 +3,204 @@
 Использует blackboxprotobuf для декодирования protobuf без схемы.
 """
 
+import asyncio
 import logging
 import struct
-from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter, itemgetter
 from typing import Any, Dict, List, Optional, Tuple
 
 import aiohttp
 
+from .http_session import get_connector
 from .protobuf_decoder import (
-    ATTENDANCE_REPORT_TYPEDEF,
     DISCIPLINES_TYPEDEF,
+    MOSCOW_TZ,
     VISITING_LOGS_TYPEDEF,
     decode_grpc_response_bytes,
+    decode_grpc_response_bytes_fast,
+    decode_protobuf_payload_fast,
+    ensure_dict_list,
     ensure_list,
+    format_fio,
     get_field,
-    get_nested,
-    parse_person_name,
+    read_grpc_payload,
     timestamp_to_datetime,
 )
+from .ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Проекция ATTENDANCE_REPORT_TYPEDEF только на поля, которые читает
+# AttendanceParser: decode_message_fast пропускает остальные поля
+# (конец занятия, ID записи, номер студбилета, информация о логе)
+# и не создаёт для них записей в словарях
+_REPORT_PARSE_TYPEDEF: Dict[str, Any] = {
+    "1": {  # Занятия (repeated)
+        "type": "message",
+        "seen_repeated": True,
+        "message_typedef": {
+            "1": {  # Информация о занятии
+                "type": "message",
+                "message_typedef": {
+                    "1": {  # Время занятия
+                        "type": "message",
+                        "message_typedef": {
+                            "1": {"type": "message", "message_typedef": {"1": {"type": "int"}}},  # start timestamp
+                        }
+                    },
+                    "2": {"type": "string"},  # Тип занятия
+                    "3": {"type": "string"},  # UUID занятия
+                }
+            },
+            "2": {  # Записи посещаемости (repeated)
+                "type": "message",
+                "seen_repeated": True,
+                "message_typedef": {
+                    "1": {"type": "string"},  # student UUID
+                    "3": {"type": "message", "message_typedef": {"2": {"type": "int"}}},  # status
+                    "4": {"type": "message"},  # empty = not marked yet
+                }
+            }
+        }
+    },
+    "2": {  # Студенты (repeated)
+        "type": "message",
+        "seen_repeated": True,
+        "message_typedef": {
+            "1": {"type": "string"},  # UUID
+            "2": {"type": "string"},  # Имя
+            "3": {"type": "string"},  # Фамилия
+            "4": {"type": "message", "message_typedef": {"1": {"type": "string"}}},  # Отчество
+        }
+    },
+}
+
+# Текст статуса посещения по коду: 0 (не отмечен) и 1 - "Н" (не был),
+# 2 - "У" (уважительная причина), 3 - "+" (был)
+_STATUS_TEXT = ("Н", "Н", "У", "+")
+
+# Время жизни кеша журналов и дисциплин пользователя (секунды)
+META_CACHE_TTL_SECONDS = 600
+# При превышении размера кеша из него вычищаются протухшие записи
+_META_CACHE_MAX_SIZE = 10_000
+
+# Время жизни отчёта о посещаемости (секунды): схлопывает повторные запросы
+# одного отчёта, например подсчёт пар и список студентов для одного занятия
+REPORT_CACHE_TTL_SECONDS = 60
+# Отчёты крупные и нужны только в пределах TTL, поэтому кеш отчётов небольшой
+_REPORT_CACHE_MAX_SIZE = 256
+
+# {(tg_user_id, "logs") | (tg_user_id, log_id, "disciplines")
+#  | (tg_user_id, log_id, "discipline_index"): value}
+# Протухшие записи не удаляются сразу: по ним делается спекулятивный запрос
+_meta_cache = TTLCache(META_CACHE_TTL_SECONDS, _META_CACHE_MAX_SIZE, keep_stale=True)
+
+# {(tg_user_id, log_id, discipline_id): report_data}
+# Протухший отчёт удаляется при чтении, а при каждой записи вычищаются остальные
+_report_cache = TTLCache(
+    REPORT_CACHE_TTL_SECONDS, _REPORT_CACHE_MAX_SIZE, sweep_on_set=True
+)
+
+
+@lru_cache(maxsize=8192)
+def _student_fio(first_name: str, surname: str, patronymic: str) -> str:
+    """
+    Короткое ФИО студента ("Фамилия И. О.").
+
+    Списки студентов одних и тех же групп разбираются на каждый запрос
+    отчёта, поэтому результат форматирования кешируется.
+    """
+    return format_fio(first_name, surname, patronymic, short=True)
+
+
+def _build_grpc_request(*fields: bytes) -> bytearray:
+    """
+    Собирает gRPC-Web фрейм из строковых полей 1, 2, ... в одном буфере.
+
+    Args:
+        *fields: Значения полей в порядке номеров (каждое короче 128 байт)
+
+    Returns:
+        Тело запроса: [flags][длина BE][protobuf]
+    """
+    body_len = 0
+    for value in fields:
+        if len(value) > 0x7F:
+            raise ValueError("Поле запроса не помещается в однобайтовый varint")
+        body_len += 2 + len(value)
+
+    buf = bytearray(5 + body_len)
+    struct.pack_into(">BI", buf, 0, 0x00, body_len)
+
+    offset = 5
+    for field_number, value in enumerate(fields, 1):
+        value_len = len(value)
+        buf[offset] = (field_number << 3) | 0x02  # length-delimited
+        buf[offset + 1] = value_len
+        buf[offset + 2 : offset + 2 + value_len] = value
+        offset += 2 + value_len
+
+    return buf
+
+
+def _make_cookie_jar(cookies: list) -> aiohttp.CookieJar:
+    """
+    Создаёт CookieJar с куки пользователя.
+
+    Args:
+        cookies: Список куки для авторизации
+
+    Returns:
+        Заполненный CookieJar
+    """
+    jar = aiohttp.CookieJar()
+    jar.update_cookies({cookie["name"]: cookie["value"] for cookie in cookies})
+    return jar
+
+
+def _create_session(cookies: list) -> aiohttp.ClientSession:
+    """
+    Создаёт сессию с куки пользователя.
+
+    Сессия работает поверх общего пула соединений (http_session), поэтому
+    keep-alive соединения к attendance.mirea.ru переживают и саму сессию.
+    Куки один раз кладутся в CookieJar сессии, функции запросов их
+    не трогают.
+
+    Args:
+        cookies: Список куки для авторизации
+
+    Returns:
+        Сессия aiohttp (закрывает вызывающий код, пул при этом остаётся открытым)
+    """
+    return aiohttp.ClientSession(
+        cookie_jar=_make_cookie_jar(cookies),
+        connector=get_connector(),
+        connector_owner=False,
+    )
+
+
+@dataclass(slots=True)
+class StudentRow:
+    """Строка результата: студент и его статус на занятии."""
+
+    fio: str
+    status: str  # "+", "Н", "У" или "" для неизвестного кода
+    status_code: int
+
+
+@dataclass(frozen=True)
+class LessonQuery:
+    """Запрос посещаемости одного занятия для get_many_lesson_attendance."""
+
+    lesson_date: str  # Формат: "YYYY-MM-DD"
+    lesson_time: str  # Формат: "HH:MM"
+    lesson_type: str  # "ЛК", "ПР", "ЛАБ"
+    lesson_index_in_day: int = 0  # Индекс пары в дне (если несколько пар одного типа)
+
 
 class AttendanceParser:
     """Парсер статистики посещаемости из protobuf данных с использованием blackboxprotobuf."""
@@ -42,27 +218,30 @@ class AttendanceParser:
         students = {}
 
         # Field 2 содержит список студентов
-        students_data = ensure_list(get_field(message, "2", []))
+        students_data = ensure_dict_list(get_field(message, "2"))
 
-        for student in students_data:
-            if not isinstance(student, dict):
-                continue
+        # Поля студента заданы в _REPORT_PARSE_TYPEDEF, поэтому читаем
+        # их напрямую через dict.get без перебора альтернативных ключей
+        _dict = dict
+        _str = str
 
-            student_uuid = get_field(student, "1", "")
-            first_name = get_field(student, "2", "")
-            surname = get_field(student, "3", "")
+        for student in students_data:
+            student_get = student.get
+            student_uuid = student_get("1", "")
+            first_name = student_get("2", "")
+            surname = student_get("3", "")
 
             # Отчество в поле 4.1
             patronymic = ""
-            patronymic_data = get_field(student, "4")
+            patronymic_data = student_get("4")
             if patronymic_data:
-                if isinstance(patronymic_data, dict):
-                    patronymic = get_field(patronymic_data, "1", "")
-                elif isinstance(patronymic_data, str):
+                if isinstance(patronymic_data, _dict):
+                    patronymic = patronymic_data.get("1", "")
+                elif isinstance(patronymic_data, _str):
                     patronymic = patronymic_data
 
             if student_uuid and (first_name or surname):
-                fio = parse_person_name(student, short=True)
+                fio = _student_fio(first_name, surname, patronymic)
                 students[student_uuid] = {
                     "fio": fio,
                     "first_name": first_name,
@@ -74,53 +253,96 @@ class AttendanceParser:
         return students
 
     def parse_lessons(
-        self, message: Dict[str, Any]
+        self,
+        message: Dict[str, Any],
+        filter_date: Optional[str] = None,
+        filter_type: Optional[str] = None,
     ) -> Tuple[List[Dict], Dict[int, Dict[str, int]]]:
         """
         Парсит занятия и посещаемость из декодированного сообщения.
 
+        Если заданы фильтры, остальные занятия отбрасываются до форматирования
+        даты и разбора записей посещаемости.
+
         Args:
             message: Декодированное protobuf сообщение
+            filter_date: Оставить только занятия этой даты (YYYY-MM-DD, МСК)
+            filter_type: Оставить только занятия этого типа (ЛК, ПР, ...)
 
         Returns:
             Кортеж (список_занятий, словарь_посещаемости)
         """
         lessons = []
-        attendance: Dict[int, Dict[str, int]] = defaultdict(dict)
+        attendance: Dict[int, Dict[str, int]] = {}
 
-        # Field 1 содержит занятия
+        # Границы дня фильтра как timestamp: сравниваем сырое время начала,
+        # не создавая datetime для каждого занятия
+        day_start_ts = day_end_ts = 0
+        if filter_date is not None:
+            try:
+                day_start = datetime.strptime(filter_date, "%Y-%m-%d")
+            except ValueError:
+                # Дата в другом формате не совпадёт ни с одним занятием
+                pass
+            else:
+                day_start_ts = int(day_start.replace(tzinfo=MOSCOW_TZ).timestamp())
+                day_end_ts = day_start_ts + 86400
+
+        # Field 1 содержит занятия. Список не фильтруем: позиция в нём —
+        # это индекс занятия в журнале
         lessons_data = ensure_list(get_field(message, "1", []))
 
+        # Поля занятий и записей заданы в _REPORT_PARSE_TYPEDEF, поэтому
+        # читаем их напрямую через dict.get без перебора альтернативных ключей
+        _dict = dict
+        _int = int
+        append_lesson = lessons.append
+
         for lesson_index, lesson_wrapper in enumerate(lessons_data):
-            if not isinstance(lesson_wrapper, dict):
+            if not isinstance(lesson_wrapper, _dict):
                 continue
 
             # Field 1.1 содержит информацию о занятии
-            lesson_info = get_field(lesson_wrapper, "1", {})
-            if not isinstance(lesson_info, dict):
+            lesson_info = lesson_wrapper.get("1", {})
+            if not isinstance(lesson_info, _dict):
                 continue
 
             # Время занятия из field 1.1.1.1 (timestamp начала)
-            start_ts = get_nested(lesson_info, "1", "1", "1", default=0)
-            end_ts = get_nested(lesson_info, "1", "2", "1", default=0)
+            start_ts = 0
+            time_info = lesson_info.get("1")
+            if isinstance(time_info, _dict):
+                start_info = time_info.get("1")
+                if isinstance(start_info, _dict):
+                    start_ts = start_info.get("1", 0)
 
             # Тип занятия из field 1.1.2
-            lesson_type = get_field(lesson_info, "2", "ЛК")
+            lesson_type = lesson_info.get("2", "ЛК")
+            if filter_type is not None and lesson_type != filter_type:
+                continue
+
+            if filter_date is not None and not (
+                isinstance(start_ts, _int) and day_start_ts <= start_ts < day_end_ts
+            ):
+                continue
 
             # UUID занятия из field 1.1.3
-            lesson_uuid = get_field(lesson_info, "3", "")
+            lesson_uuid = lesson_info.get("3", "")
 
             # Форматируем дату и время
             date_str = f"Lesson {lesson_index + 1}"
             time_str = ""
 
-            if isinstance(start_ts, int) and start_ts > 1000000000:
+            if isinstance(start_ts, _int) and start_ts > 1000000000:
                 dt = timestamp_to_datetime(start_ts)
                 if dt:
                     date_str = dt.strftime("%Y-%m-%d")
                     time_str = dt.strftime("%H:%M")
 
-            lessons.append(
+            # Без валидного времени занятие не может совпасть с датой фильтра
+            if filter_date is not None and date_str != filter_date:
+                continue
+
+            append_lesson(
                 {
                     "type": lesson_type,
                     "date": date_str,
@@ -131,53 +353,78 @@ class AttendanceParser:
             )
 
             # Field 1.2 содержит записи посещаемости студентов (repeated)
-            attendance_records = ensure_list(get_field(lesson_wrapper, "2", []))
+            attendance_records = ensure_dict_list(lesson_wrapper.get("2"))
+            if not attendance_records:
+                continue
 
-            for record in attendance_records:
-                if not isinstance(record, dict):
-                    continue
+            # Словарь посещаемости занятия создаём один раз, а не ищем на каждую запись
+            lesson_attendance: Dict[str, int] = {}
 
+            for record in attendance_records:
                 # Field 2.1 = student UUID
-                student_uuid = get_field(record, "1", "")
+                student_uuid = record.get("1", "")
 
                 # Field 2.3 содержит статус посещения
                 # Field 2.3.2 = status code (1=Н, 2=У, 3=+)
-                status_info = get_field(record, "3")
-                if isinstance(status_info, dict):
-                    status = get_field(status_info, "2", 0)
-                    if student_uuid and isinstance(status, int):
-                        attendance[lesson_index][student_uuid] = status
-                elif get_field(record, "4") is not None:
+                status_info = record.get("3")
+                if isinstance(status_info, _dict):
+                    status = status_info.get("2", 0)
+                    if student_uuid and isinstance(status, _int):
+                        lesson_attendance[student_uuid] = status
+                elif record.get("4") is not None:
                     # Field 4 = пустой dict означает что студент не отмечен
                     if student_uuid:
-                        attendance[lesson_index][student_uuid] = 0
+                        lesson_attendance[student_uuid] = 0
+
+            if lesson_attendance:
+                attendance[lesson_index] = lesson_attendance
 
-        return lessons, dict(attendance)
+        return lessons, attendance
 
-    def parse(self, content: bytes) -> Dict:
+    def parse(
+        self,
+        content: bytes,
+        filter_date: Optional[str] = None,
+        filter_type: Optional[str] = None,
+    ) -> Dict:
         """
         Полный парсинг данных статистики.
 
         Args:
-            content: Байтовые данные protobuf
+            content: Protobuf payload отчёта (без gRPC-Web заголовка)
+            filter_date: Оставить только занятия этой даты (см. parse_lessons)
+            filter_type: Оставить только занятия этого типа (см. parse_lessons)
 
         Returns:
-            Словарь с ключами students, lessons, attendance
+            Словарь с ключами students, lessons, attendance, total_lessons
+            (total_lessons - число всех занятий в отчёте, без учёта фильтров)
         """
-        message = decode_grpc_response_bytes(content, ATTENDANCE_REPORT_TYPEDEF)
+        # Отчёт может быть большим: декодируем напрямую по урезанной схеме,
+        # blackboxprotobuf остаётся запасным вариантом
+        message = decode_protobuf_payload_fast(content, _REPORT_PARSE_TYPEDEF)
 
         if not message:
-            return {"students": {}, "lessons": [], "attendance": {}}
+            return {"students": {}, "lessons": [], "attendance": {}, "total_lessons": 0}
 
         students = self.parse_students(message)
-        lessons, attendance = self.parse_lessons(message)
+        lessons, attendance = self.parse_lessons(message, filter_date, filter_type)
+
+        return {
+            "students": students,
+            "lessons": lessons,
+            "attendance": attendance,
+            "total_lessons": len(ensure_list(get_field(message, "1", []))),
+        }
+
 
-        return {"students": students, "lessons": lessons, "attendance": attendance}
+# Парсер не хранит состояния между вызовами, поэтому используется один экземпляр
+_PARSER = AttendanceParser()
 
 
 async def get_visiting_logs(
     cookies: list,
     user_agent: Optional[str] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> List[Dict]:
     """
     Получить список доступных журналов (семестров).
@@ -185,6 +432,7 @@ async def get_visiting_logs(
     Args:
         cookies: Список куки для авторизации
         user_agent: User-Agent для запроса
+        session: Открытая сессия с куки пользователя (иначе создаётся своя)
 
     Returns:
         Список словарей с информацией о семестрах
@@ -204,68 +452,68 @@ async def get_visiting_logs(
 
     request_body = bytes([0x00, 0x00, 0x00, 0x00, 0x00])
 
-    connector = aiohttp.TCPConnector()
+    if session is None:
+        async with _create_session(cookies) as own_session:
+            return await get_visiting_logs(cookies, user_agent, own_session)
 
-    async with aiohttp.ClientSession(connector=connector) as session:
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
-        session.cookie_jar.update_cookies(cookies_dict)
+    async with session.post(
+        url,
+        headers=headers,
+        data=request_body,
+    ) as response:
+        if response.status != 200:
+            return []
 
-        async with session.post(
-            url,
-            headers=headers,
-            data=request_body,
-        ) as response:
-            if response.status != 200:
-                return []
+        content = await response.read()
 
-            content = await response.read()
-            message = decode_grpc_response_bytes(content, VISITING_LOGS_TYPEDEF)
+    message = decode_grpc_response_bytes(content, VISITING_LOGS_TYPEDEF)
 
-            if not message:
-                return []
+    if not message:
+        return []
 
-            visiting_logs = []
+    visiting_logs = []
 
-            # Field 1 содержит список журналов
-            logs_data = ensure_list(get_field(message, "1", []))
+    # Field 1 содержит список журналов
+    logs_data = ensure_list(get_field(message, "1", []))
 
-            for log_wrapper in logs_data:
-                if not isinstance(log_wrapper, dict):
-                    continue
+    for log_wrapper in logs_data:
+        if not isinstance(log_wrapper, dict):
+            continue
 
-                # Field 1.1 содержит информацию о журнале
-                log_info = get_field(log_wrapper, "1", {})
-                if not isinstance(log_info, dict):
-                    continue
+        # Field 1.1 содержит информацию о журнале
+        log_info = get_field(log_wrapper, "1", {})
+        if not isinstance(log_info, dict):
+            continue
 
-                # Field 1.1.1 = log UUID
-                log_uuid = get_field(log_info, "1", "")
+        # Field 1.1.1 = log UUID
+        log_uuid = get_field(log_info, "1", "")
 
-                # Field 1.1.2 = group name
-                group_name = get_field(log_info, "2", "")
+        # Field 1.1.2 = group name
+        group_name = get_field(log_info, "2", "")
 
-                # Field 1.1.6 содержит информацию о семестре
-                semester_info = get_field(log_info, "6", {})
-                semester_name = ""
-                if isinstance(semester_info, dict):
-                    semester_name = get_field(semester_info, "2", "")
+        # Field 1.1.6 содержит информацию о семестре
+        semester_info = get_field(log_info, "6", {})
+        semester_name = ""
+        if isinstance(semester_info, dict):
+            semester_name = get_field(semester_info, "2", "")
 
-                if log_uuid and group_name:
-                    visiting_logs.append(
-                        {
-                            "id": log_uuid,
-                            "group": group_name,
-                            "semester": semester_name,
-                        }
-                    )
+        if log_uuid and group_name:
+            visiting_logs.append(
+                {
+                    "id": log_uuid,
+                    "group": group_name,
+                    "semester": semester_name,
+                }
+            )
 
-            return visiting_logs
+    return visiting_logs
 
 
 async def get_disciplines(
     visiting_log_id: str,
     cookies: list,
     user_agent: Optional[str] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> List[Dict]:
     """
     Получить список дисциплин для журнала.
@@ -274,6 +522,7 @@ async def get_disciplines(
         visiting_log_id: ID журнала посещений
         cookies: Список куки для авторизации
         user_agent: User-Agent для запроса
+        session: Открытая сессия с куки пользователя (иначе создаётся своя)
 
     Returns:
         Список словарей с информацией о дисциплинах
@@ -291,58 +540,52 @@ async def get_disciplines(
         or "Mozilla/5.0 (X11; Linux x86_64; rv:140.0) Gecko/20100101 Firefox/140.0",
     }
 
-    # Формируем protobuf request
-    visiting_log_bytes = visiting_log_id.encode("utf-8")
-
-    protobuf_data = (
-        bytes([0x0A, len(visiting_log_bytes)])  # Field 1: visiting_log_id
-        + visiting_log_bytes
-    )
-
-    request_body = struct.pack(">BI", 0x00, len(protobuf_data)) + protobuf_data
+    # Формируем protobuf request: Field 1 = visiting_log_id
+    request_body = _build_grpc_request(visiting_log_id.encode("utf-8"))
 
-    connector = aiohttp.TCPConnector()
+    if session is None:
+        async with _create_session(cookies) as own_session:
+            return await get_disciplines(
+                visiting_log_id, cookies, user_agent, own_session
+            )
 
-    async with aiohttp.ClientSession(connector=connector) as session:
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
-        session.cookie_jar.update_cookies(cookies_dict)
+    async with session.post(
+        url,
+        headers=headers,
+        data=request_body,
+    ) as response:
+        if response.status != 200:
+            return []
 
-        async with session.post(
-            url,
-            headers=headers,
-            data=request_body,
-        ) as response:
-            if response.status != 200:
-                return []
+        content = await response.read()
 
-            content = await response.read()
-            message = decode_grpc_response_bytes(content, DISCIPLINES_TYPEDEF)
+    message = decode_grpc_response_bytes_fast(content, DISCIPLINES_TYPEDEF)
 
-            if not message:
-                return []
+    if not message:
+        return []
 
-            disciplines = []
+    disciplines = []
 
-            # Field 1 содержит список дисциплин (repeated)
-            disc_data = ensure_list(get_field(message, "1", []))
+    # Field 1 содержит список дисциплин (repeated)
+    disc_data = ensure_list(get_field(message, "1", []))
 
-            for disc in disc_data:
-                if not isinstance(disc, dict):
-                    continue
+    for disc in disc_data:
+        if not isinstance(disc, dict):
+            continue
 
-                # Field 1.1 = UUID, Field 1.2 = name
-                disc_uuid = get_field(disc, "1", "")
-                disc_name = get_field(disc, "2", "")
+        # Field 1.1 = UUID, Field 1.2 = name
+        disc_uuid = get_field(disc, "1", "")
+        disc_name = get_field(disc, "2", "")
 
-                if disc_uuid and disc_name:
-                    disciplines.append(
-                        {
-                            "id": disc_uuid,
-                            "name": disc_name.strip(),
-                        }
-                    )
+        if disc_uuid and disc_name:
+            disciplines.append(
+                {
+                    "id": disc_uuid,
+                    "name": disc_name.strip(),
+                }
+            )
 
-            return disciplines
+    return disciplines
 
 
 async def get_attendance_report(
@@ -350,6 +593,7 @@ async def get_attendance_report(
     visiting_log_id: str,
     cookies: list,
     user_agent: Optional[str] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> bytes:
     """
     Получить отчет о посещаемости.
@@ -361,9 +605,10 @@ async def get_attendance_report(
         visiting_log_id: ID журнала посещений
         cookies: Список куки для авторизации
         user_agent: User-Agent для запроса
+        session: Открытая сессия с куки пользователя (иначе создаётся своя)
 
     Returns:
-        Байтовые данные отчета о посещаемости
+        Protobuf payload отчета о посещаемости (без gRPC-Web заголовка)
     """
     url = "https://attendance.mirea.ru/rtu_tc.attendance.api.AttendanceService/GetAttendanceVisitingLogReportForDiscipline"
 
@@ -379,35 +624,29 @@ async def get_attendance_report(
     }
 
     # Параметры в protobuf идут в обратном порядке
-    discipline_bytes = discipline_id.encode("utf-8")
-    visiting_log_bytes = visiting_log_id.encode("utf-8")
-
-    protobuf_data = (
-        bytes([0x0A, len(discipline_bytes)])
-        + discipline_bytes
-        + bytes([0x12, len(visiting_log_bytes)])
-        + visiting_log_bytes
+    request_body = _build_grpc_request(
+        discipline_id.encode("utf-8"),
+        visiting_log_id.encode("utf-8"),
     )
 
-    request_body = struct.pack(">BI", 0x00, len(protobuf_data)) + protobuf_data
-
-    connector = aiohttp.TCPConnector()
-
-    async with aiohttp.ClientSession(connector=connector) as session:
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
-        session.cookie_jar.update_cookies(cookies_dict)
-
-        async with session.post(
-            url,
-            headers=headers,
-            data=request_body,
-        ) as response:
-            content = await response.read()
-            if response.status == 200 and len(content) > 0:
-                return content
+    if session is None:
+        async with _create_session(cookies) as own_session:
+            return await get_attendance_report(
+                discipline_id, visiting_log_id, cookies, user_agent, own_session
+            )
 
+    async with session.post(
+        url,
+        headers=headers,
+        data=request_body,
+    ) as response:
+        if response.status != 200:
             return b""
 
+        # Отчёт может быть большим: читаем фрейм прямо из потока,
+        # без буферизации всего ответа и последующего среза заголовка
+        return await read_grpc_payload(response)
+
 
 async def get_lesson_attendance_data(
     cookies: list,
@@ -435,226 +674,513 @@ async def get_lesson_attendance_data(
         tg_user_id: ID пользователя в Telegram
 
     Returns:
-        Список [результат_с_данными_студентов]
+        Список [результат_с_данными_студентов]; студенты в результате -
+        объекты StudentRow, отсортированные по ФИО
     """
     try:
         logger.info(
-            f"Получение данных о посещаемости для: {lesson_subject}, {lesson_date}, {lesson_time}, {lesson_type}"
+            "Получение данных о посещаемости для: %s, %s, %s, %s",
+            lesson_subject,
+            lesson_date,
+            lesson_time,
+            lesson_type,
         )
 
-        # Получаем список семестров
-        logs = await get_visiting_logs(cookies, user_agent)
-        if not logs:
-            logger.warning("Не удалось получить список семестров")
-            return [None]
+        async with _create_session(cookies) as session:
+            return await _get_lesson_attendance_data(
+                session,
+                cookies,
+                lesson_date,
+                lesson_time,
+                lesson_type,
+                lesson_subject,
+                lesson_index_in_day,
+                user_agent,
+                tg_user_id,
+            )
+
+    except Exception as e:
+        logger.error("Ошибка при получении данных о посещаемости: %s", e, exc_info=True)
+        raise
+
+
+async def get_many_lesson_attendance(
+    cookies: list,
+    lesson_subject: str,
+    queries: List[LessonQuery],
+    db=None,
+    user_agent: Optional[str] = None,
+    tg_user_id: Optional[int] = None,
+) -> List[Optional[Dict]]:
+    """
+    Получить данные о посещаемости для нескольких занятий одного предмета.
+
+    Отчёт по дисциплине скачивается и разбирается один раз, после чего
+    каждый запрос отвечается поиском по уже разобранным занятиям.
 
-        logger.info(f"Найдено семестров: {len(logs)}")
-        # Берем текущий семестр (первый в списке - самый актуальный)
-        current_log = logs[0]
+    Args:
+        cookies: Список куки для авторизации
+        lesson_subject: Название предмета
+        queries: Запросы занятий (дата, время, тип, индекс в дне)
+        db: Объект базы данных
+        user_agent: User-Agent для запроса
+        tg_user_id: ID пользователя в Telegram
+
+    Returns:
+        Список результатов в порядке queries (None, если занятие не найдено)
+    """
+    try:
         logger.info(
-            f"Выбран семестр: {current_log['semester']} ({current_log['group']})"
+            "Получение данных о посещаемости для %s: %d занятий",
+            lesson_subject,
+            len(queries),
         )
 
-        # Получаем список дисциплин для этого семестра
-        disciplines = await get_disciplines(current_log["id"], cookies, user_agent)
-        if not disciplines:
-            logger.warning("Не удалось получить список дисциплин")
-            return [None]
+        async with _create_session(cookies) as session:
+            report_data = await _get_subject_report(
+                session, cookies, lesson_subject, user_agent, tg_user_id
+            )
+        if not report_data:
+            return [None] * len(queries)
 
-        logger.info(f"Найдено дисциплин: {len(disciplines)}")
-        for i, disc in enumerate(disciplines):
-            logger.debug(f"  {i + 1}. {disc['name']}")
-
-        # Ищем нужную дисциплину по названию (улучшенный поиск)
-        target_discipline = None
-
-        # Нормализуем название предмета для поиска
-        normalized_subject = lesson_subject.lower().strip()
-
-        # Сначала ищем точное совпадение
-        for disc in disciplines:
-            if normalized_subject == disc["name"].lower().strip():
-                target_discipline = disc
-                logger.info(f"Найдено точное совпадение дисциплины: {disc['name']}")
-                break
-
-        # Если точного совпадения нет, ищем частичное
-        if not target_discipline:
-            for disc in disciplines:
-                disc_name_lower = disc["name"].lower()
-                # Проверяем вхождение в обе стороны
-                if (
-                    normalized_subject in disc_name_lower
-                    or disc_name_lower in normalized_subject
-                ):
-                    target_discipline = disc
-                    logger.info(
-                        f"Найдено частичное совпадение дисциплины: {disc['name']}"
-                    )
-                    break
-
-        # Если всё еще не нашли, проверяем по ключевым словам
-        if not target_discipline:
-            # Разбиваем название на слова
-            subject_words = set(normalized_subject.split())
-            best_match = None
-            best_match_count = 0
-
-            for disc in disciplines:
-                disc_words = set(disc["name"].lower().split())
-                # Считаем совпадающие слова
-                common_words = subject_words & disc_words
-                if len(common_words) > best_match_count:
-                    best_match_count = len(common_words)
-                    best_match = disc
-
-            if best_match and best_match_count > 0:
-                target_discipline = best_match
-                logger.info(
-                    f"Найдено совпадение по ключевым словам: {best_match['name']} ({best_match_count} слов)"
+        parsed = _PARSER.parse(report_data)
+        students = parsed["students"]
+        attendance = parsed["attendance"]
+
+        # Занятия по (дата, тип) в порядке журнала
+        lessons_by_key: Dict[Tuple[str, str], List[Dict]] = {}
+        for lesson in parsed["lessons"]:
+            lessons_by_key.setdefault((lesson["date"], lesson["type"]), []).append(
+                lesson
+            )
+
+        results: List[Optional[Dict]] = []
+        for query in queries:
+            matching_lessons = lessons_by_key.get(
+                (query.lesson_date, query.lesson_type)
+            )
+            if not matching_lessons:
+                logger.warning(
+                    "Не найдено занятий для: %s, тип=%s",
+                    query.lesson_date,
+                    query.lesson_type,
                 )
+                results.append(None)
+                continue
+            results.append(
+                _build_lesson_result(
+                    matching_lessons,
+                    query.lesson_index_in_day,
+                    students,
+                    attendance,
+                    parsed["total_lessons"],
+                )
+            )
+        return results
 
-        if not target_discipline:
-            logger.warning(
-                f"Не удалось найти дисциплину для предмета: {lesson_subject}"
+    except Exception as e:
+        logger.error("Ошибка при получении данных о посещаемости: %s", e, exc_info=True)
+        raise
+
+
+def _build_discipline_index(
+    disciplines: List[Dict],
+) -> Tuple[List[Tuple[Dict, str, frozenset]], Dict[str, Dict]]:
+    """
+    Строит индекс дисциплин с заранее нормализованными названиями.
+
+    Названия приводятся через casefold() один раз при построении индекса,
+    все проходы _find_discipline используют готовые строки и множества слов.
+
+    Args:
+        disciplines: Список дисциплин из get_disciplines
+
+    Returns:
+        Кортеж (записи, по_названию): список кортежей
+        (дисциплина, нормализованное_название, слова_названия) и словарь
+        нормализованное_название -> дисциплина для точного поиска
+    """
+    entries = []
+    by_name: Dict[str, Dict] = {}
+    for disc in disciplines:
+        name = disc["name"].casefold().strip()
+        entries.append((disc, name, frozenset(name.split())))
+        # При одинаковых названиях побеждает первая, как при переборе списка
+        by_name.setdefault(name, disc)
+    return entries, by_name
+
+
+def _get_discipline_index(
+    tg_user_id: Optional[int],
+    log_id: str,
+    disciplines: List[Dict],
+) -> Tuple[List[Tuple[Dict, str, frozenset]], Dict[str, Dict]]:
+    """Возвращает индекс дисциплин журнала из кеша или строит его."""
+    if tg_user_id is None:
+        return _build_discipline_index(disciplines)
+
+    key = (tg_user_id, log_id, "discipline_index")
+    cached = _meta_cache.get(key)
+    # Индекс валиден, только если построен по тому же списку дисциплин
+    if cached is not None and cached[0] is disciplines:
+        return cached[1]
+
+    index = _build_discipline_index(disciplines)
+    _meta_cache.set(key, (disciplines, index))
+    return index
+
+
+def _find_discipline(
+    index: Tuple[List[Tuple[Dict, str, frozenset]], Dict[str, Dict]],
+    lesson_subject: str,
+) -> Optional[Dict]:
+    """
+    Ищет дисциплину по названию предмета: точное совпадение, вхождение,
+    затем наибольшее число общих слов.
+
+    Args:
+        index: Индекс дисциплин из _build_discipline_index
+        lesson_subject: Название предмета из расписания
+
+    Returns:
+        Найденная дисциплина или None
+    """
+    entries, by_name = index
+
+    # Нормализуем название предмета так же, как названия в индексе
+    normalized_subject = lesson_subject.casefold().strip()
+
+    # Точное совпадение ищем по словарю, без перебора списка
+    exact = by_name.get(normalized_subject)
+    if exact is not None:
+        logger.info("Найдено точное совпадение дисциплины: %s", exact["name"])
+        return exact
+
+    # Если точного совпадения нет, ищем частичное (вхождение в обе стороны)
+    for disc, name, _ in entries:
+        if normalized_subject in name or name in normalized_subject:
+            logger.info("Найдено частичное совпадение дисциплины: %s", disc["name"])
+            return disc
+
+    # Если всё еще не нашли, проверяем по ключевым словам
+    subject_words = set(normalized_subject.split())
+    best_match = None
+    best_match_count = 0
+
+    for disc, _, words in entries:
+        # Считаем совпадающие слова
+        common_count = len(subject_words & words)
+        if common_count > best_match_count:
+            best_match_count = common_count
+            best_match = disc
+
+    if best_match and best_match_count > 0:
+        logger.info(
+            "Найдено совпадение по ключевым словам: %s (%d слов)",
+            best_match["name"],
+            best_match_count,
+        )
+        return best_match
+
+    return None
+
+
+async def _get_current_log_and_disciplines(
+    session: aiohttp.ClientSession,
+    cookies: list,
+    user_agent: Optional[str],
+    tg_user_id: Optional[int],
+) -> Tuple[Optional[Dict], List[Dict]]:
+    """
+    Возвращает текущий журнал (семестр) и его дисциплины, используя кеш.
+
+    При свежем кеше журналов запрос за ними не делается. Если кеш журналов
+    устарел, дисциплины для прежнего журнала запрашиваются параллельно
+    с обновлением журналов и используются, если текущий журнал не сменился.
+
+    Args:
+        session: Открытая сессия с куки пользователя
+        cookies: Список куки для авторизации
+        user_agent: User-Agent для запроса
+        tg_user_id: ID пользователя в Telegram (без него кеш не используется)
+
+    Returns:
+        Кортеж (текущий_журнал или None, список_дисциплин)
+    """
+    logs_key = (tg_user_id, "logs")
+    logs = _meta_cache.get(logs_key) if tg_user_id is not None else None
+    speculative_log_id = None
+    disciplines = None
+
+    if logs is None:
+        stale_logs = (
+            _meta_cache.get(logs_key, allow_stale=True)
+            if tg_user_id is not None
+            else None
+        )
+        if stale_logs:
+            # Журнал почти всегда тот же — запрашиваем дисциплины заранее
+            speculative_log_id = stale_logs[0]["id"]
+            logs, disciplines = await asyncio.gather(
+                get_visiting_logs(cookies, user_agent, session),
+                get_disciplines(speculative_log_id, cookies, user_agent, session),
             )
-            logger.debug(f"Доступные дисциплины: {[d['name'] for d in disciplines]}")
-            return [None]
-
-        logger.info(f"Получение отчета для дисциплины: {target_discipline['name']}")
-        # Получаем отчет о посещаемости
-        report_data = await get_attendance_report(
-            target_discipline["id"],
-            current_log["id"],
-            cookies,
-            user_agent,
+        else:
+            logs = await get_visiting_logs(cookies, user_agent, session)
+        if tg_user_id is not None:
+            _meta_cache.set(logs_key, logs)
+
+    if not logs:
+        return None, []
+
+    logger.info("Найдено семестров: %d", len(logs))
+    # Берем текущий семестр (первый в списке - самый актуальный)
+    current_log = logs[0]
+    logger.info(
+        "Выбран семестр: %s (%s)", current_log["semester"], current_log["group"]
+    )
+
+    disciplines_key = (tg_user_id, current_log["id"], "disciplines")
+    # Дисциплины, запрошенные заранее для того же журнала, - свежие
+    fetched = speculative_log_id == current_log["id"]
+    if not fetched:
+        disciplines = (
+            _meta_cache.get(disciplines_key) if tg_user_id is not None else None
+        )
+    if disciplines is None:
+        # Получаем список дисциплин для этого семестра
+        disciplines = await get_disciplines(
+            current_log["id"], cookies, user_agent, session
         )
+        fetched = True
+    # Кеш пишем только после запроса: иначе каждое попадание продлевало бы TTL
+    if fetched and tg_user_id is not None:
+        _meta_cache.set(disciplines_key, disciplines)
 
-        if not report_data:
-            logger.warning("Не удалось получить отчет о посещаемости")
-            return [None]
+    return current_log, disciplines
+
+
+async def _get_lesson_attendance_data(
+    session: aiohttp.ClientSession,
+    cookies: list,
+    lesson_date: str,
+    lesson_time: str,
+    lesson_type: str,
+    lesson_subject: str,
+    lesson_index_in_day: int,
+    user_agent: Optional[str],
+    tg_user_id: Optional[int],
+) -> list:
+    """Тело get_lesson_attendance_data: все запросы идут через одну сессию."""
+    report_data = await _get_subject_report(
+        session, cookies, lesson_subject, user_agent, tg_user_id
+    )
+    if not report_data:
+        return [None]
 
-        logger.info(f"Получен отчет, размер: {len(report_data)} байт")
+    # Парсим только занятия нужной даты и типа, игнорируя время
+    # (может быть разница в часовых поясах)
+    parsed = _PARSER.parse(report_data, filter_date=lesson_date, filter_type=lesson_type)
 
-        # Парсим данные
-        parser = AttendanceParser()
-        parsed = parser.parse(report_data)
+    students = parsed["students"]
+    matching_lessons = parsed["lessons"]
+    attendance = parsed["attendance"]
 
-        students = parsed["students"]
-        lessons = parsed["lessons"]
-        attendance = parsed["attendance"]
+    logger.info(
+        "Распарсено: студентов=%d, подходящих занятий=%d",
+        len(students),
+        len(matching_lessons),
+    )
+
+    logger.info(
+        "Ищем занятие: дата=%s, тип=%s, индекс в дне=%s",
+        lesson_date,
+        lesson_type,
+        lesson_index_in_day,
+    )
 
-        logger.info(f"Распарсено: студентов={len(students)}, занятий={len(lessons)}")
+    if not matching_lessons:
+        logger.warning("Не найдено занятий для: %s, тип=%s", lesson_date, lesson_type)
+        return [None]
+
+    return [
+        _build_lesson_result(
+            matching_lessons,
+            lesson_index_in_day,
+            students,
+            attendance,
+            parsed["total_lessons"],
+        )
+    ]
 
-        # Ищем нужное занятие по дате и типу
-        target_lesson = None
-        lesson_index = None
 
-        logger.info(
-            f"Ищем занятие: дата={lesson_date}, тип={lesson_type}, индекс в дне={lesson_index_in_day}"
+async def _get_subject_report(
+    session: aiohttp.ClientSession,
+    cookies: list,
+    lesson_subject: str,
+    user_agent: Optional[str],
+    tg_user_id: Optional[int],
+) -> bytes:
+    """
+    Находит дисциплину текущего семестра по названию предмета и
+    возвращает её отчёт о посещаемости.
+
+    Returns:
+        Protobuf payload отчёта или b"", если журнал, дисциплина или отчёт
+        не найдены
+    """
+    current_log, disciplines = await _get_current_log_and_disciplines(
+        session, cookies, user_agent, tg_user_id
+    )
+    if current_log is None:
+        logger.warning("Не удалось получить список семестров")
+        return b""
+
+    if not disciplines:
+        logger.warning("Не удалось получить список дисциплин")
+        return b""
+
+    logger.info("Найдено дисциплин: %d", len(disciplines))
+    # Список дисциплин выводим только если DEBUG действительно включён
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, disc in enumerate(disciplines):
+            logger.debug("  %d. %s", i + 1, disc["name"])
+
+    # Ищем нужную дисциплину по названию (улучшенный поиск)
+    discipline_index = _get_discipline_index(
+        tg_user_id, current_log["id"], disciplines
+    )
+    target_discipline = _find_discipline(discipline_index, lesson_subject)
+
+    if not target_discipline:
+        logger.warning(
+            "Не удалось найти дисциплину для предмета: %s", lesson_subject
         )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Доступные дисциплины: %s", [d["name"] for d in disciplines]
+            )
+        return b""
+
+    logger.info("Получение отчета для дисциплины: %s", target_discipline["name"])
+    # Получаем отчет о посещаемости
+    report_data = await _get_attendance_report_cached(
+        session,
+        cookies,
+        user_agent,
+        tg_user_id,
+        target_discipline["id"],
+        current_log["id"],
+    )
 
-        # Ищем по дате и типу, игнорируя время (может быть разница в часовых поясах)
-        matching_lessons = []
-        for lesson in lessons:
-            # Сравниваем даты - приводим обе к формату YYYY-MM-DD
-            lesson_date_str = lesson["date"]
+    if not report_data:
+        logger.warning("Не удалось получить отчет о посещаемости")
+        return b""
 
-            # Если дата в формате DD.MM или DD.MM.YYYY, преобразуем
-            try:
-                if "." in lesson_date_str:
-                    parts = lesson_date_str.split(".")
-                    if len(parts) == 2:  # DD.MM
-                        # Добавляем год из lesson_date
-                        year = lesson_date.split("-")[0]
-                        lesson_date_formatted = (
-                            f"{year}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-                        )
-                    elif len(parts) == 3:  # DD.MM.YYYY
-                        lesson_date_formatted = (
-                            f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-                        )
-                    else:
-                        lesson_date_formatted = lesson_date_str
-                elif (
-                    "-" in lesson_date_str and len(lesson_date_str) == 10
-                ):  # уже YYYY-MM-DD
-                    lesson_date_formatted = lesson_date_str
-                else:
-                    lesson_date_formatted = lesson_date_str
-
-                if (
-                    lesson_date_formatted == lesson_date
-                    and lesson["type"] == lesson_type
-                ):
-                    matching_lessons.append(lesson)
-            except Exception as e:
-                logger.debug(f"Ошибка сравнения дат: {e}")
-                continue
+    logger.info("Получен отчет, размер: %d байт", len(report_data))
+    return report_data
 
-        if not matching_lessons:
-            logger.warning(f"Не найдено занятий для: {lesson_date}, тип={lesson_type}")
-            return [None]
 
-        # Сортируем по индексу (порядок в журнале)
-        matching_lessons.sort(key=lambda x: x["index"])
+async def _get_attendance_report_cached(
+    session: aiohttp.ClientSession,
+    cookies: list,
+    user_agent: Optional[str],
+    tg_user_id: Optional[int],
+    discipline_id: str,
+    log_id: str,
+) -> bytes:
+    """
+    get_attendance_report с кешем на REPORT_CACHE_TTL_SECONDS.
 
-        logger.info(
-            f"Найдено {len(matching_lessons)} занятий {lesson_type} на {lesson_date}:"
+    Параллельные запросы одного отчёта одним пользователем ждут первую
+    загрузку, а не скачивают отчёт повторно.
+    """
+    if tg_user_id is None:
+        return await get_attendance_report(
+            discipline_id, log_id, cookies, user_agent, session
         )
+
+    return await _report_cache.get_or_load(
+        (tg_user_id, log_id, discipline_id),
+        lambda: get_attendance_report(
+            discipline_id, log_id, cookies, user_agent, session
+        ),
+    )
+
+
+def _build_lesson_result(
+    matching_lessons: List[Dict],
+    lesson_index_in_day: int,
+    students: Dict[str, Dict],
+    attendance: Dict[int, Dict[str, int]],
+    total_lessons: int,
+) -> Dict:
+    """
+    Выбирает занятие из подходящих по дате и типу и собирает результат
+    со статусами студентов.
+
+    Args:
+        matching_lessons: Непустой список занятий нужной даты и типа
+        lesson_index_in_day: Индекс пары в дне
+        students: Студенты из AttendanceParser.parse
+        attendance: Посещаемость из AttendanceParser.parse
+        total_lessons: Общее количество пар по предмету в семестре
+
+    Returns:
+        Словарь с ключами lesson, students, total_lessons
+    """
+    # Сортируем по индексу (порядок в журнале)
+    matching_lessons = sorted(matching_lessons, key=itemgetter("index"))
+
+    logger.info(
+        "Найдено %d занятий %s на %s:",
+        len(matching_lessons),
+        matching_lessons[0]["type"],
+        matching_lessons[0]["date"],
+    )
+    if logger.isEnabledFor(logging.DEBUG):
         for i, l in enumerate(matching_lessons):
             logger.debug(
-                f"  {i}. {l['type']} {l['date']} {l['time']} (index={l['index']})"
+                "  %d. %s %s %s (index=%d)", i, l["type"], l["date"], l["time"], l["index"]
             )
 
-        # Берем занятие по индексу (первая в журнале = первая в расписании)
-        if lesson_index_in_day >= len(matching_lessons):
-            logger.warning(
-                f"Индекс {lesson_index_in_day} больше количества занятий {len(matching_lessons)}"
-            )
-            # Берем последнее
-            lesson_index_in_day = len(matching_lessons) - 1
+    # Берем занятие по индексу (первая в журнале = первая в расписании)
+    if lesson_index_in_day >= len(matching_lessons):
+        logger.warning(
+            "Индекс %s больше количества занятий %d",
+            lesson_index_in_day,
+            len(matching_lessons),
+        )
+        # Берем последнее
+        lesson_index_in_day = len(matching_lessons) - 1
 
-        target_lesson = matching_lessons[lesson_index_in_day]
-        lesson_index = target_lesson["index"]
+    target_lesson = matching_lessons[lesson_index_in_day]
+    lesson_index = target_lesson["index"]
 
-        logger.info(f"Выбрано занятие #{lesson_index_in_day}: {target_lesson}")
+    logger.info("Выбрано занятие #%s: %s", lesson_index_in_day, target_lesson)
 
-        # Получаем список студентов с их статусами для этого занятия
-        lesson_attendance = attendance.get(lesson_index, {})
-        logger.info(f"Найдено записей посещаемости: {len(lesson_attendance)}")
+    # Получаем список студентов с их статусами для этого занятия
+    lesson_attendance = attendance.get(lesson_index, {})
+    logger.info("Найдено записей посещаемости: %d", len(lesson_attendance))
 
-        result = {
-            "lesson": target_lesson,
-            "students": [],
-            "total_lessons": len(
-                lessons
-            ),  # Общее количество пар по этому предмету в семестре
-        }
+    result = {
+        "lesson": target_lesson,
+        "students": [],
+        # Общее количество пар по этому предмету в семестре
+        "total_lessons": total_lessons,
+    }
 
-        for student_uuid, status in lesson_attendance.items():
-            student_info = students.get(student_uuid, {})
-            fio = student_info.get("fio", f"UUID:{student_uuid[:8]}")
-
-            # Маппинг статусов
-            status_text = ""
-            if status == 3:
-                status_text = "+"  # Был
-            elif status == 2:
-                status_text = "У"  # Уважительная причина
-            elif status == 0 or status == 1:
-                status_text = "Н"  # Не был
-
-            result["students"].append(
-                {"fio": fio, "status": status_text, "status_code": status}
-            )
+    append_student = result["students"].append
+    for student_uuid, status in lesson_attendance.items():
+        student_info = students.get(student_uuid, {})
+        fio = student_info.get("fio", f"UUID:{student_uuid[:8]}")
 
-        # Сортируем студентов по ФИО
-        result["students"].sort(key=lambda x: x["fio"])
+        append_student(
+            StudentRow(fio, _STATUS_TEXT[status] if 0 <= status < 4 else "", status)
+        )
 
-        logger.info(f"Готово! Найдено студентов: {len(result['students'])}")
-        return [result]
+    # Сортируем студентов по ФИО
+    result["students"].sort(key=attrgetter("fio"))
 
-    except Exception as e:
-        logger.error(f"Ошибка при получении данных о посещаемости: {e}", exc_info=True)
-        raise
+    logger.info("Готово! Найдено студентов: %d", len(result["students"]))
+    return result
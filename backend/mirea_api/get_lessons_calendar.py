@@ -4,14 +4,56 @@
 """
 
 import logging
-from typing import Any, Dict, List, Optional
+import struct
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import aiohttp
-import blackboxprotobuf
+
+from backend.mirea_api.http_session import build_cookie_header, get_session
+from backend.mirea_api.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Заголовки как в оригинальном запросе - БИНАРНЫЙ формат.
+# Cookie (общая сессия куки не хранит) и User-Agent добавляются на каждый вызов
+_CALENDAR_HEADERS_BASE = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Content-Type": "application/grpc-web+proto",
+    "Origin": "https://attendance-app.mirea.ru",
+    "Referer": "https://attendance-app.mirea.ru/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+    "x-grpc-web": "1",
+    "x-requested-with": "XMLHttpRequest",
+    "pulse-app-type": "pulse-app",
+    "pulse-app-version": "1.5.9+4499",
+}
+
+# Время жизни кеша календаря (секунды): календарь меняется несколько раз в
+# день, а запрашивается при каждом обновлении страницы
+CALENDAR_CACHE_TTL_SECONDS = 300
+# Максимальное количество календарей в кеше
+_CALENDAR_CACHE_MAX_SIZE = 10_000
+
+# {(tg_user_id, start_ts, end_ts): calendar}
+_calendar_cache = TTLCache(CALENDAR_CACHE_TTL_SECONDS, _CALENDAR_CACHE_MAX_SIZE)
+
+# Длина payload в gRPC-Web заголовке (big-endian uint32)
+_UINT32_BE = struct.Struct(">I")
+
+# Заголовок gRPC-Web кадра запроса: флаги + длина payload
+_GRPC_FRAME_HEADER = struct.Struct(">BI")
+
+# Ключи месяцев календаря ("01".."12"), индекс - номер месяца
+_MONTH_STRS = tuple(f"{m:02d}" for m in range(13))
+
 # Схема для GetDailyLessonsCountForSemesterOfAvailableVisitingLogs
+# (документирует формат; разбор выполняет _parse_calendar_bytes)
 CALENDAR_TYPEDEF = {
     "1": {
         "type": "message",
@@ -31,21 +73,119 @@ CALENDAR_TYPEDEF = {
 }
 
 
-def _skip_grpc_header(data: bytes) -> bytes:
-    """Убирает gRPC-Web заголовок."""
+def _skip_grpc_header(data: bytes) -> Union[bytes, memoryview]:
+    """
+    Убирает gRPC-Web заголовок.
+
+    Payload возвращается как memoryview без копирования ответа.
+    """
     if len(data) < 5:
         return b""
     if data[0] == 0x80:  # Trailer frame
         return b""
     if data[0] == 0x00:
-        length = int.from_bytes(data[1:5], "big")
+        length = _UINT32_BE.unpack_from(data, 1)[0]
         if length == 0:
             return b""
         if 5 + length <= len(data):
-            return data[5 : 5 + length]
+            return memoryview(data)[5 : 5 + length]
     return data
 
 
+def _read_varint(buf: Union[bytes, memoryview], pos: int) -> Tuple[int, int]:
+    """Читает varint из buf начиная с pos. Возвращает (значение, новая_позиция)."""
+    byte = buf[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    result = byte & 0x7F
+    shift = 7
+    pos += 1
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _skip_field(buf: Union[bytes, memoryview], pos: int, wire_type: int) -> int:
+    """Пропускает значение поля с данным wire type. Возвращает новую позицию."""
+    if wire_type == 0:
+        return _read_varint(buf, pos)[1]
+    if wire_type == 2:
+        length, pos = _read_varint(buf, pos)
+        return pos + length
+    if wire_type == 1:
+        return pos + 8
+    if wire_type == 5:
+        return pos + 4
+    raise ValueError(f"Неподдерживаемый wire type {wire_type}")
+
+
+def _parse_calendar_bytes(
+    buf: Union[bytes, memoryview],
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Разбирает protobuf payload календаря по схеме CALENDAR_TYPEDEF.
+
+    Схема фиксирована и мала, поэтому вместо универсального декодера
+    varint читаются напрямую, без промежуточных словарей.
+    Неизвестные поля пропускаются.
+
+    Args:
+        buf: Protobuf payload без gRPC-Web заголовка
+
+    Returns:
+        Список кортежей (количество_пар, год, месяц, день)
+
+    Raises:
+        ValueError, IndexError: Если данные повреждены
+    """
+    entries: List[Tuple[int, int, int, int]] = []
+    pos = 0
+    end = len(buf)
+
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        if key != 0x0A:  # Не field 1 (length-delimited)
+            pos = _skip_field(buf, pos, key & 0x07)
+            continue
+
+        # Field 1: день календаря {1: количество, 2: {1: год, 2: месяц, 3: день}}
+        length, pos = _read_varint(buf, pos)
+        entry_end = pos + length
+        count = year = month = day = 0
+
+        while pos < entry_end:
+            key, pos = _read_varint(buf, pos)
+            if key == 0x08:  # Field 1: количество пар
+                count, pos = _read_varint(buf, pos)
+            elif key == 0x12:  # Field 2: дата
+                length, pos = _read_varint(buf, pos)
+                date_end = pos + length
+                while pos < date_end:
+                    key, pos = _read_varint(buf, pos)
+                    if key == 0x08:
+                        year, pos = _read_varint(buf, pos)
+                    elif key == 0x10:
+                        month, pos = _read_varint(buf, pos)
+                    elif key == 0x18:
+                        day, pos = _read_varint(buf, pos)
+                    else:
+                        pos = _skip_field(buf, pos, key & 0x07)
+                if pos != date_end:
+                    raise ValueError("Поле даты выходит за границы сообщения")
+            else:
+                pos = _skip_field(buf, pos, key & 0x07)
+
+        if pos != entry_end or pos > end:
+            raise ValueError("Запись календаря выходит за границы сообщения")
+        entries.append((count, year, month, day))
+
+    return entries
+
+
 def _parse_calendar_response(content: bytes) -> Dict[str, Dict[str, Dict[int, int]]]:
     """
     Парсит ответ GetDailyLessonsCountForSemesterOfAvailableVisitingLogs.
@@ -67,57 +207,52 @@ def _parse_calendar_response(content: bytes) -> Dict[str, Dict[str, Dict[int, in
         return {}
 
     try:
-        message, _ = blackboxprotobuf.decode_message(protobuf_data, CALENDAR_TYPEDEF)
-    except Exception as e:
-        logger.warning(f"Ошибка декодирования со схемой: {e}")
-        try:
-            message, _ = blackboxprotobuf.decode_message(protobuf_data)
-        except Exception as e2:
-            logger.warning(f"Ошибка декодирования без схемы: {e2}")
-            return {}
-
-    calendar: Dict[str, Dict[str, Dict[int, int]]] = {}
-
-    if "1" not in message:
-        return calendar
-
-    entries = message["1"]
-    if not isinstance(entries, list):
-        entries = [entries]
-
-    for entry in entries:
-        if not isinstance(entry, dict):
-            continue
-
-        count = entry.get("1", 0)
-        date_info = entry.get("2", {})
-
-        if not isinstance(date_info, dict):
-            continue
+        entries = _parse_calendar_bytes(protobuf_data)
+    except (ValueError, IndexError) as e:
+        logger.warning("Ошибка декодирования календаря: %s", e)
+        return {}
 
-        year = date_info.get("1")
-        month = date_info.get("2")
-        day = date_info.get("3")
+    # Группируем по целочисленным ключам, а строковые ключи API ("2025", "12")
+    # создаём один раз на год и месяц, а не на каждый день
+    by_year: Dict[int, Dict[int, Dict[int, int]]] = {}
 
-        if not all([year, month, day]):
+    for count, year, month, day in entries:
+        if not (year and month and day):
             continue
 
-        year_str = str(year)
-        month_str = f"{month:02d}"
+        by_year.setdefault(year, {}).setdefault(month, {})[day] = count
 
-        if year_str not in calendar:
-            calendar[year_str] = {}
-        if month_str not in calendar[year_str]:
-            calendar[year_str][month_str] = {}
+    return {
+        str(year): {
+            (_MONTH_STRS[month] if 0 < month < 13 else f"{month:02d}"): days
+            for month, days in months.items()
+        }
+        for year, months in by_year.items()
+    }
 
-        calendar[year_str][month_str][day] = count
 
-    return calendar
+# Готовые varint для однобайтовых значений (теги, малые числа)
+_SMALL_VARINTS = [bytes((i,)) for i in range(128)]
 
 
 def _encode_varint(value: int) -> bytes:
     """Кодирует число в varint формат protobuf."""
-    result = []
+    if value < 0x80:
+        return _SMALL_VARINTS[value]
+    if value < 0x4000:
+        return bytes(((value & 0x7F) | 0x80, value >> 7))
+    if 1 << 28 <= value < 1 << 35:
+        # Unix timestamp в секундах всегда занимает 5 байт: разворачиваем цикл
+        return bytes(
+            (
+                (value & 0x7F) | 0x80,
+                ((value >> 7) & 0x7F) | 0x80,
+                ((value >> 14) & 0x7F) | 0x80,
+                ((value >> 21) & 0x7F) | 0x80,
+                value >> 28,
+            )
+        )
+    result = bytearray()
     while value > 127:
         result.append((value & 0x7F) | 0x80)
         value >>= 7
@@ -125,6 +260,7 @@ def _encode_varint(value: int) -> bytes:
     return bytes(result)
 
 
+@lru_cache(maxsize=256)
 def _build_calendar_request(start_ts: int, end_ts: int) -> bytes:
     """
     Создаёт protobuf запрос для GetDailyLessonsCountForSemesterOfAvailableVisitingLogs.
@@ -132,21 +268,37 @@ def _build_calendar_request(start_ts: int, end_ts: int) -> bytes:
     Структура:
     - Field 2: {Field 1: start_timestamp}
     - Field 3: {Field 1: end_timestamp}
+
+    Кадр собирается в одном заранее выделенном буфере без промежуточных bytes.
+    Результат кешируется: bytes неизменяемы, а границы по умолчанию
+    округляются до часа и совпадают у всех запросов в пределах часа.
     """
-    # Field 2.1 = start_ts
     start_varint = _encode_varint(start_ts)
-    field_2_1 = bytes([0x08]) + start_varint  # field 1, varint
-    field_2 = bytes([0x12, len(field_2_1)]) + field_2_1  # field 2, length-delimited
-
-    # Field 3.1 = end_ts
     end_varint = _encode_varint(end_ts)
-    field_3_1 = bytes([0x08]) + end_varint  # field 1, varint
-    field_3 = bytes([0x1A, len(field_3_1)]) + field_3_1  # field 3, length-delimited
+    start_len = len(start_varint)
+    end_len = len(end_varint)
 
-    payload = field_2 + field_3
+    # Каждое поле: тег + длина + тег вложенного field 1 + varint
+    payload_len = 6 + start_len + end_len
+    buf = bytearray(5 + payload_len)
 
     # gRPC-Web header: flags(1) + length(4) + payload
-    return bytes([0x00, 0x00, 0x00, 0x00, len(payload)]) + payload
+    _GRPC_FRAME_HEADER.pack_into(buf, 0, 0x00, payload_len)
+
+    # Field 2.1 = start_ts
+    buf[5] = 0x12  # field 2, length-delimited
+    buf[6] = 1 + start_len
+    buf[7] = 0x08  # field 1, varint
+    pos = 8 + start_len
+    buf[8:pos] = start_varint
+
+    # Field 3.1 = end_ts
+    buf[pos] = 0x1A  # field 3, length-delimited
+    buf[pos + 1] = 1 + end_len
+    buf[pos + 2] = 0x08  # field 1, varint
+    buf[pos + 3 :] = end_varint
+
+    return bytes(buf)
 
 
 async def get_daily_lessons_count(
@@ -154,84 +306,103 @@ async def get_daily_lessons_count(
     user_agent: Optional[str] = None,
     start_ts: Optional[int] = None,
     end_ts: Optional[int] = None,
+    tg_user_id: Optional[int] = None,
+    cache_bust: bool = False,
 ) -> Optional[Dict[str, Dict[str, Dict[int, int]]]]:
     """
     Получить количество занятий по дням для указанного периода.
 
-    Использует прямой endpoint GetDailyLessonsCountForSemesterOfAvailableVisitingLogs.
+    При переданном tg_user_id ответ кешируется на CALENDAR_CACHE_TTL_SECONDS
+    по ключу (tg_user_id, start_ts, end_ts), а параллельные запросы одного
+    календаря ждут единственный запрос к API.
 
     Args:
         cookies: Список куки для авторизации
         user_agent: User-Agent для запроса
         start_ts: Unix timestamp начала периода (опционально, по умолчанию -2 месяца)
         end_ts: Unix timestamp конца периода (опционально, по умолчанию +3 месяца)
+        tg_user_id: Telegram ID пользователя для кеширования (опционально)
+        cache_bust: Игнорировать кеш и запросить календарь заново
 
     Returns:
         Словарь с календарем занятий:
         {"2025": {"12": {1: 4, 2: 3, ...}}, "2026": {"01": {14: 1, ...}}}
     """
-    from datetime import datetime, timedelta
+    if tg_user_id is None:
+        return await _fetch_daily_lessons_count(cookies, user_agent, start_ts, end_ts)
 
-    API_BASE = "https://attendance.mirea.ru/rtu_tc.attendance.api"
-    URL = f"{API_BASE}.LessonService/GetDailyLessonsCountForSemesterOfAvailableVisitingLogs"
+    # Ключ строится по переданным границам, а не по вычисленным: период по
+    # умолчанию сдвигается каждую секунду, но в пределах TTL это неважно
+    key = (tg_user_id, start_ts, end_ts)
+    return await _calendar_cache.get_or_load(
+        key,
+        lambda: _fetch_daily_lessons_count(cookies, user_agent, start_ts, end_ts),
+        refresh=cache_bust,
+    )
 
-    # Заголовки как в оригинальном запросе - БИНАРНЫЙ формат
-    headers = {
-        "Accept": "*/*",
-        "Accept-Encoding": "gzip, deflate, br, zstd",
-        "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
-        "Content-Type": "application/grpc-web+proto",
-        "Origin": "https://attendance-app.mirea.ru",
-        "Referer": "https://attendance-app.mirea.ru/",
-        "Sec-Fetch-Dest": "empty",
-        "Sec-Fetch-Mode": "cors",
-        "Sec-Fetch-Site": "same-site",
-        "x-grpc-web": "1",
-        "x-requested-with": "XMLHttpRequest",
-        "pulse-app-type": "pulse-app",
-        "pulse-app-version": "1.5.9+4499",
-    }
 
-    if user_agent:
-        headers["User-Agent"] = user_agent
+async def _fetch_daily_lessons_count(
+    cookies: List[Dict[str, Any]],
+    user_agent: Optional[str],
+    start_ts: Optional[int],
+    end_ts: Optional[int],
+) -> Optional[Dict[str, Dict[str, Dict[int, int]]]]:
+    """
+    Запрашивает календарь через прямой endpoint
+    GetDailyLessonsCountForSemesterOfAvailableVisitingLogs.
+
+    Args:
+        cookies: Список куки для авторизации
+        user_agent: User-Agent для запроса
+        start_ts: Unix timestamp начала периода или None
+        end_ts: Unix timestamp конца периода или None
+
+    Returns:
+        Словарь с календарем занятий или None
+    """
+    API_BASE = "https://attendance.mirea.ru/rtu_tc.attendance.api"
+    URL = f"{API_BASE}.LessonService/GetDailyLessonsCountForSemesterOfAvailableVisitingLogs"
 
     try:
         # Если даты не указаны, используем значения по умолчанию
-        now = datetime.now()
+        # Округляем до часа, чтобы тело запроса бралось из кеша
+        now_ts = int(time.time()) // 3600 * 3600
         if start_ts is None:
-            start_date = now - timedelta(days=60)  # ~2 месяца назад
-            start_ts = int(start_date.timestamp())
+            start_ts = now_ts - 60 * 86400  # ~2 месяца назад
         if end_ts is None:
-            end_date = now + timedelta(days=90)  # ~3 месяца вперёд
-            end_ts = int(end_date.timestamp())
+            end_ts = now_ts + 90 * 86400  # ~3 месяца вперёд
 
         # Создаём БИНАРНЫЙ protobuf запрос
         request_body = _build_calendar_request(start_ts, end_ts)
-        logger.debug(
-            f"Calendar request: start_ts={start_ts}, end_ts={end_ts}, body_hex={request_body.hex()}"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Calendar request: start_ts=%s, end_ts=%s, body_hex=%s",
+                start_ts,
+                end_ts,
+                request_body.hex(),
+            )
 
-        # Cookie header напрямую
-        cookie_header = "; ".join(f"{c['name']}={c['value']}" for c in cookies)
-        headers["Cookie"] = cookie_header
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                URL,
-                headers=headers,
-                data=request_body,  # БИНАРНЫЕ данные
-                timeout=aiohttp.ClientTimeout(total=15),
-            ) as response:
-                logger.debug(f"Calendar API response status: {response.status}")
-                if response.status != 200:
-                    logger.warning(f"Ошибка API: статус {response.status}")
-                    return None
-
-                # Ответ тоже БИНАРНЫЙ
-                content = await response.read()
-                logger.debug(f"Calendar API response length: {len(content)} bytes")
-                if len(content) > 0:
-                    logger.debug(f"Calendar API first 50 bytes: {content[:50].hex()}")
+        headers = _CALENDAR_HEADERS_BASE | {"Cookie": build_cookie_header(cookies)}
+        if user_agent:
+            headers["User-Agent"] = user_agent
+
+        session = await get_session()
+        async with session.post(
+            URL,
+            headers=headers,
+            data=request_body,  # БИНАРНЫЕ данные
+            timeout=aiohttp.ClientTimeout(total=15),
+        ) as response:
+            logger.debug("Calendar API response status: %s", response.status)
+            if response.status != 200:
+                logger.warning("Ошибка API: статус %s", response.status)
+                return None
+
+            # Ответ тоже БИНАРНЫЙ
+            content = await response.read()
+            if content and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Calendar API response length: %d bytes", len(content))
+                logger.debug("Calendar API first 50 bytes: %s", content[:50].hex())
 
         if not content or len(content) < 10:
             logger.debug("Пустой ответ от API")
@@ -239,14 +410,14 @@ async def get_daily_lessons_count(
 
         calendar = _parse_calendar_response(content)
 
-        if calendar:
+        if calendar and logger.isEnabledFor(logging.DEBUG):
             total_days = sum(
                 len(days) for months in calendar.values() for days in months.values()
             )
-            logger.debug(f"Получено {total_days} дней с занятиями")
+            logger.debug("Получено %d дней с занятиями", total_days)
 
         return calendar if calendar else None
 
     except Exception as e:
-        logger.error(f"Ошибка получения календаря: {e}", exc_info=True)
+        logger.error("Ошибка получения календаря: %s", e, exc_info=True)
         return None
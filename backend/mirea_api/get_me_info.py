@@ -2,23 +2,28 @@
 # -*- coding: utf-8 -*-
 """
 Модуль для получения информации о пользователе из MIREA API.
-Использует blackboxprotobuf для декодирования protobuf ответов.
+Ответ декодируется сгенерированными protobuf классами (pb2/me_info_pb2),
+blackboxprotobuf остаётся запасным вариантом при изменении структуры ответа.
 """
 
 import logging
+from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
-import aiohttp
+from google.protobuf.message import DecodeError
 
 from backend.database import DBModel
+from backend.mirea_api.http_session import build_cookie_header, get_session
 from backend.mirea_api.protobuf_decoder import (
     ME_INFO_TYPEDEF,
     decode_grpc_response_bytes,
     format_fio,
     get_nested,
+    skip_grpc_header_view,
 )
+from backend.pb2 import me_info_pb2
 
-from .get_cookies import generate_random_mobile_user_agent
+from .get_cookies import get_user_agent
 
 # Бинарное тело запроса GetMeInfo (gRPC-Web proto формат)
 # Структура: {1: "https://attendance-app.mirea.ru", 2: {1: "https://attendance-app.mirea.ru"}, 3: 1}
@@ -28,10 +33,52 @@ _GET_ME_INFO_REQUEST_BODY = bytes.fromhex(
     "2d6170702e6d697265612e72751801"
 )
 
+# Статические заголовки запросов GetMeInfo (User-Agent и Cookie добавляются на каждый вызов)
+_ME_INFO_HEADERS_BASE = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Content-Type": "application/grpc-web+proto",
+    "pulse-app-type": "pulse-app",
+    "pulse-app-version": "1.6.0+5256",
+    "Origin": "https://attendance-app.mirea.ru",
+    "Referer": "https://attendance-app.mirea.ru/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+    "x-grpc-web": "1",
+    "x-requested-with": "XMLHttpRequest",
+}
+
+# Набор заголовков get_me_info_full
+_ME_INFO_FULL_HEADERS_BASE = {
+    "Accept": "*/*",
+    "Content-Type": "application/grpc-web+proto",
+    "pulse-app-type": "pulse-app",
+    "pulse-app-version": "1.6.0+5256",
+    "Origin": "https://attendance-app.mirea.ru",
+    "Referer": "https://attendance-app.mirea.ru/",
+    "x-grpc-web": "1",
+    "x-requested-with": "XMLHttpRequest",
+}
+
 logger = logging.getLogger(__name__)
 
 
-def parse_me_info(message: Dict[str, Any]) -> Dict[str, Any]:
+@dataclass(slots=True)
+class UserInfo:
+    """Информация о пользователе из GetMeInfo; отсутствующие поля - пустые строки."""
+
+    uuid: str = ""
+    first_name: str = ""
+    last_name: str = ""
+    patronymic: str = ""
+    email: str = ""
+    fio: str = ""  # Полное ФИО
+    fio_short: str = ""  # Сокращённое ФИО (Фамилия И. О.)
+
+
+def parse_me_info(message: Dict[str, Any]) -> UserInfo:
     """
     Парсит ответ GetMeInfo.
 
@@ -51,15 +98,13 @@ def parse_me_info(message: Dict[str, Any]) -> Dict[str, Any]:
         message: Декодированное protobuf сообщение
 
     Returns:
-        Словарь с информацией о пользователе
+        Информация о пользователе (пустая, если её не удалось найти)
     """
-    result = {}
-
     if not message:
         logger.warning("Пустое сообщение")
-        return result
+        return UserInfo()
 
-    logger.debug(f"Структура сообщения: {list(message.keys())}")
+    logger.debug("Структура сообщения: %s", list(message))
 
     # get_nested автоматически обрабатывает альтернативные ключи blackboxprotobuf (1-1, 1-2, ...)
     user_info = get_nested(message, "1", "1", default={})
@@ -82,22 +127,10 @@ def parse_me_info(message: Dict[str, Any]) -> Dict[str, Any]:
             f"Ключи: {list(message.keys())}, Содержимое (первые 500 символов): "
             f"{str(message)[:500]}"
         )
-        return result
+        return UserInfo()
 
-    # UUID пользователя
-    uuid = user_info.get("1", "")
-    if uuid:
-        result["uuid"] = uuid
-
-    # Имя
     first_name = user_info.get("2", "")
-    if first_name:
-        result["first_name"] = first_name
-
-    # Фамилия
     last_name = user_info.get("3", "")
-    if last_name:
-        result["last_name"] = last_name
 
     # Отчество
     patronymic_data = user_info.get("4", {})
@@ -106,23 +139,84 @@ def parse_me_info(message: Dict[str, Any]) -> Dict[str, Any]:
         patronymic = patronymic_data.get("1", "")
     elif isinstance(patronymic_data, str):
         patronymic = patronymic_data
-    if patronymic:
-        result["patronymic"] = patronymic
 
-    # Email
-    email = user_info.get("6", "")
-    if email:
-        result["email"] = email
+    result = UserInfo(
+        uuid=user_info.get("1", ""),
+        first_name=first_name,
+        last_name=last_name,
+        patronymic=patronymic,
+        email=user_info.get("6", ""),
+    )
 
     # Форматируем полное ФИО
     if first_name or last_name:
-        result["fio"] = format_fio(first_name, last_name, patronymic, short=False)
-        result["fio_short"] = format_fio(first_name, last_name, patronymic, short=True)
+        result.fio = format_fio(first_name, last_name, patronymic, short=False)
+        result.fio_short = format_fio(first_name, last_name, patronymic, short=True)
 
-    logger.debug(f"Распарсена информация о пользователе: {result.get('fio_short', '')}")
+    logger.debug("Распарсена информация о пользователе: %s", result.fio_short)
     return result
 
 
+def _parse_me_info_proto(response_bytes: bytes) -> UserInfo:
+    """
+    Разбирает ответ GetMeInfo классом me_info_pb2.Response.
+
+    Args:
+        response_bytes: Raw bytes ответа от API (с gRPC-Web заголовком)
+
+    Returns:
+        Информация о пользователе (пустая, если имени и фамилии в ответе нет)
+
+    Raises:
+        DecodeError: Если payload не разбирается по схеме
+    """
+    response = me_info_pb2.Response.FromString(skip_grpc_header_view(response_bytes))
+    user = response.info.user
+    first_name = user.first_name
+    last_name = user.last_name
+    if not (first_name or last_name):
+        return UserInfo()
+
+    patronymic = user.patronymic.value
+    return UserInfo(
+        uuid=user.uuid,
+        first_name=first_name,
+        last_name=last_name,
+        patronymic=patronymic,
+        email=user.email,
+        fio=format_fio(first_name, last_name, patronymic, short=False),
+        fio_short=format_fio(first_name, last_name, patronymic, short=True),
+    )
+
+
+def decode_me_info(response_bytes: bytes) -> UserInfo:
+    """
+    Декодирует ответ GetMeInfo в UserInfo.
+
+    Сначала используется сгенерированный класс me_info_pb2. Если ответ
+    не разбирается по схеме или имя не найдено на ожидаемом месте,
+    ответ декодируется через ME_INFO_TYPEDEF и parse_me_info, который
+    проверяет альтернативные пути.
+
+    Args:
+        response_bytes: Raw bytes ответа от API (с gRPC-Web заголовком)
+
+    Returns:
+        Информация о пользователе (пустая, если её не удалось найти)
+    """
+    try:
+        user_info = _parse_me_info_proto(response_bytes)
+    except DecodeError as e:
+        logger.warning("Ошибка декодирования GetMeInfo по схеме me_info.proto: %s", e)
+    else:
+        if user_info.fio:
+            logger.debug("Распарсена информация о пользователе: %s", user_info.fio_short)
+            return user_info
+
+    message = decode_grpc_response_bytes(response_bytes, ME_INFO_TYPEDEF)
+    return parse_me_info(message)
+
+
 async def _query_me_info(
     cookies: list,
     tg_user_id: int,
@@ -145,52 +239,34 @@ async def _query_me_info(
         Exception: При ошибках запроса
     """
     try:
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
-
         url = "https://attendance.mirea.ru/rtu_tc.rtu_attend.app.UserService/GetMeInfo"
-        headers = {
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
-            "Content-Type": "application/grpc-web+proto",
-            "pulse-app-type": "pulse-app",
-            "pulse-app-version": "1.6.0+5256",
-            "Origin": "https://attendance-app.mirea.ru",
-            "Referer": "https://attendance-app.mirea.ru/",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-site",
+        headers = _ME_INFO_HEADERS_BASE | {
             "User-Agent": (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             ),
-            "x-grpc-web": "1",
-            "x-requested-with": "XMLHttpRequest",
+            # Общая сессия куки не хранит, передаём их явно
+            "Cookie": build_cookie_header(cookies),
         }
 
-        async with aiohttp.ClientSession() as session:
-            session.cookie_jar.update_cookies(cookies_dict)
-            async with session.post(
-                url,
-                data=_GET_ME_INFO_REQUEST_BODY,
-                headers=headers,
-                timeout=4,
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"Ошибка запроса к {url}. Код: {response.status}")
-                response_bytes = await response.read()
+        session = await get_session()
+        async with session.post(
+            url,
+            data=_GET_ME_INFO_REQUEST_BODY,
+            headers=headers,
+            timeout=4,
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Ошибка запроса к {url}. Код: {response.status}")
+            response_bytes = await response.read()
 
         # Декодируем бинарный protobuf ответ
-        logger.debug(f"Длина ответа: {len(response_bytes)} байт")
-        message = decode_grpc_response_bytes(response_bytes, ME_INFO_TYPEDEF)
-        logger.debug(f"Декодированное сообщение: {message}")
-
-        # Парсим информацию о пользователе
-        user_info = parse_me_info(message)
+        logger.debug("Длина ответа: %d байт", len(response_bytes))
+        user_info = decode_me_info(response_bytes)
 
         # Возвращаем полное ФИО для обратной совместимости
-        fio = user_info.get("fio", "")
+        fio = user_info.fio
         return [fio] if fio else []
 
     except Exception as e:
@@ -236,11 +312,11 @@ async def get_me_info_full(
     tg_user_id: int,
     db: DBModel,
     user_agent: Optional[str] = None,
-) -> Dict[str, Any]:
+) -> UserInfo:
     """
     Получает полную информацию о пользователе из GetMeInfo.
 
-    В отличие от get_me_info_data, возвращает словарь со всеми полями:
+    В отличие от get_me_info_data, возвращает UserInfo со всеми полями:
     - uuid: UUID пользователя
     - first_name: Имя
     - last_name: Фамилия
@@ -256,45 +332,35 @@ async def get_me_info_full(
         user_agent: User-Agent для запроса
 
     Returns:
-        Словарь с информацией о пользователе
+        Информация о пользователе
 
     Raises:
         Exception: При ошибках запроса
     """
     try:
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
-
         url = "https://attendance.mirea.ru/rtu_tc.rtu_attend.app.UserService/GetMeInfo"
-        headers = {
-            "Accept": "*/*",
-            "Content-Type": "application/grpc-web+proto",
-            "pulse-app-type": "pulse-app",
-            "pulse-app-version": "1.6.0+5256",
-            "Origin": "https://attendance-app.mirea.ru",
-            "Referer": "https://attendance-app.mirea.ru/",
-            "x-grpc-web": "1",
-            "x-requested-with": "XMLHttpRequest",
+        headers = _ME_INFO_FULL_HEADERS_BASE | {
             "User-Agent": (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             ),
+            # Общая сессия куки не хранит, передаём их явно
+            "Cookie": build_cookie_header(cookies),
         }
 
-        async with aiohttp.ClientSession() as session:
-            session.cookie_jar.update_cookies(cookies_dict)
-            async with session.post(
-                url,
-                data=_GET_ME_INFO_REQUEST_BODY,
-                headers=headers,
-                timeout=4,
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"Ошибка запроса к {url}. Код: {response.status}")
-                response_bytes = await response.read()
-
-        message = decode_grpc_response_bytes(response_bytes, ME_INFO_TYPEDEF)
-        return parse_me_info(message)
+        session = await get_session()
+        async with session.post(
+            url,
+            data=_GET_ME_INFO_REQUEST_BODY,
+            headers=headers,
+            timeout=4,
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Ошибка запроса к {url}. Код: {response.status}")
+            response_bytes = await response.read()
+
+        return decode_me_info(response_bytes)
 
     except Exception as e:
         logger.error(f"Ошибка при получении полной информации о пользователе: {e}")
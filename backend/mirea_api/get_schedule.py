@@ -1,20 +1,37 @@
-import base64
+import binascii
 import logging
-from typing import Optional
+from typing import Optional, Union
 
-import aiohttp
 from fastapi import HTTPException
 
 from backend.database import DBModel
-from backend.mirea_api.get_cookies import generate_random_mobile_user_agent
+from backend.mirea_api.get_cookies import get_user_agent
+from backend.mirea_api.http_session import build_cookie_header, get_session
 
 logger = logging.getLogger(__name__)
 
+# Статические заголовки gRPC-Web запроса (User-Agent и Cookie добавляются на каждый вызов)
+_SCHEDULE_HEADERS_BASE = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Content-Type": "application/grpc-web+proto",
+    "pulse-app-type": "pulse-app",
+    "pulse-app-version": "1.6.0+5256",
+    "Origin": "https://attendance-app.mirea.ru",
+    "Referer": "https://attendance-app.mirea.ru/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+    "x-grpc-web": "1",
+    "x-requested-with": "XMLHttpRequest",
+}
+
 
 async def get_user_schedule(
     cookies: list,
     db: DBModel,
-    b64_data: str,
+    b64_data: Union[str, bytes],
     user_agent: Optional[str] = None,
     tg_user_id: Optional[int] = None,
 ) -> list:
@@ -24,61 +41,49 @@ async def get_user_schedule(
     Args:
         cookies: Список куки для авторизации
         db: Объект базы данных
-        b64_data: Base64-кодированные данные запроса (gRPC-Web фрейм)
+        b64_data: gRPC-Web фрейм запроса: raw bytes или base64-строка
         user_agent: User-Agent для запроса
         tg_user_id: ID пользователя в Telegram
 
     Returns:
-        Список [base64_данные_ответа]
+        Список [бинарные_данные_ответа] (gRPC-Web фрейм как есть)
 
     Raises:
         HTTPException: При ошибке запроса
     """
-    cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
     url = "https://attendance.mirea.ru/rtu_tc.attendance.api.LessonService/GetAvailableLessonsOfVisitingLogs"
-    headers = {
-        "Accept": "*/*",
-        "Accept-Encoding": "gzip, deflate, br, zstd",
-        "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
-        "Content-Type": "application/grpc-web+proto",
-        "pulse-app-type": "pulse-app",
-        "pulse-app-version": "1.6.0+5256",
-        "Origin": "https://attendance-app.mirea.ru",
-        "Referer": "https://attendance-app.mirea.ru/",
-        "Sec-Fetch-Dest": "empty",
-        "Sec-Fetch-Mode": "cors",
-        "Sec-Fetch-Site": "same-site",
+    headers = _SCHEDULE_HEADERS_BASE | {
         "User-Agent": (
             user_agent
             if user_agent is not None
-            else generate_random_mobile_user_agent()
+            else get_user_agent(tg_user_id)
         ),
-        "x-grpc-web": "1",
-        "x-requested-with": "XMLHttpRequest",
+        # Общая сессия куки не хранит, передаём их явно
+        "Cookie": build_cookie_header(cookies),
     }
 
-    # Декодируем base64 в бинарные данные для отправки как grpc-web+proto
-    request_body = base64.b64decode(b64_data)
+    # Запрос уходит как grpc-web+proto: base64 декодируем только если он пришёл строкой
+    request_body = (
+        b64_data if isinstance(b64_data, bytes) else binascii.a2b_base64(b64_data)
+    )
     try:
-        async with aiohttp.ClientSession() as session:
-            session.cookie_jar.update_cookies(cookies_dict)
-            async with session.post(
-                url,
-                headers=headers,
-                data=request_body,
-                timeout=4,
-            ) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=response.status, detail=str(response.status)
-                    )
+        session = await get_session()
+        async with session.post(
+            url,
+            headers=headers,
+            data=request_body,
+            timeout=4,
+        ) as response:
+            if response.status != 200:
+                raise HTTPException(
+                    status_code=response.status, detail=str(response.status)
+                )
 
-                # Читаем бинарный ответ и кодируем обратно в base64
-                response_bytes = await response.read()
+            # Бинарный ответ отдаём как есть, без перекодирования в base64
+            response_bytes = await response.read()
 
-        response_b64 = base64.b64encode(response_bytes).decode("utf-8")
         logger.debug(f"Schedule response: {len(response_bytes)} bytes")
-        return [response_b64]
+        return [response_bytes]
 
     except Exception as e:
         logger.error(f"Ошибка при получении расписания: {e}")
@@ -2,33 +2,75 @@
 # -*- coding: utf-8 -*-
 """
 Модуль для получения баллов БРС (балльно-рейтинговой системы) из MIREA API.
-Использует blackboxprotobuf для декодирования protobuf ответов.
+Ответ декодируется сгенерированными protobuf классами (backend/pb2/brs_pb2.py,
+схема в backend/proto_files/brs.proto).
 """
 import asyncio
 import logging
 import struct
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-import aiohttp
+from google.protobuf.message import DecodeError
 
 from backend.database import DBModel
-from backend.mirea_api.get_cookies import generate_random_mobile_user_agent
-from backend.mirea_api.protobuf_decoder import (
-    BRS_TYPEDEF,
-    decode_grpc_response_bytes,
-    ensure_list,
-    fixed64_to_double,
-    get_field,
-    get_nested,
-)
+from backend.mirea_api.get_cookies import get_user_agent
+from backend.mirea_api.protobuf_decoder import skip_grpc_header_view
 from backend.mirea_api.get_groups import _query_get_group
+from backend.mirea_api.http_session import build_cookie_header, get_session
+from backend.mirea_api.ttl_cache import TTLCache
+from backend.pb2 import brs_pb2
 
 logger = logging.getLogger(__name__)
 
+# Статические заголовки запроса баллов (User-Agent и Cookie добавляются на каждый вызов)
+_POINTS_HEADERS_BASE = {
+    "Content-Type": "application/grpc-web+proto",
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+    "pulse-app-type": "pulse-app",
+    "pulse-app-version": "1.6.0+5256",
+    "x-grpc-web": "1",
+    "x-requested-with": "XMLHttpRequest",
+    "Origin": "https://attendance-app.mirea.ru",
+    "Referer": "https://attendance-app.mirea.ru/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+}
+
+# Время жизни кеша журнала пользователя для запроса баллов (секунды):
+# журнал меняется только на границе семестров, а запрос групп стоит лишний RTT
+SEMESTER_UUID_TTL_SECONDS = 86400
+# Максимальное количество пользователей в кеше
+_SEMESTER_UUID_CACHE_MAX_SIZE = 10_000
+
+# {tg_user_id: semester_uuid}
+_semester_uuid_cache = TTLCache(SEMESTER_UUID_TTL_SECONDS, _SEMESTER_UUID_CACHE_MAX_SIZE)
+
+# Префикс фрейма запроса баллов: флаги, длина payload, тег и длина Field 1
+_POINTS_FRAME_PREFIX = struct.Struct(">BIBB")
+
+# Порядок категорий БРС в ответе; остальные категории идут следом
+_PREFERRED_ORDER = (
+    "Текущий контроль",
+    "Семестровый контроль",
+    "Посещения",
+    "Достижения",
+)
+
+# Категория -> ключ старого формата fields (field6 - общий балл)
+_LEGACY_MAPPING = {
+    "Текущий контроль": "field2",
+    "Посещения": "field3",
+    "Достижения": "field4",
+    "Семестровый контроль": "field5",
+}
+
 
 def decode_grpc_response(grpc_response_bytes: bytes) -> List[Dict[str, Any]]:
     """
-    Декодирует ответ БРС API с помощью blackboxprotobuf.
+    Декодирует ответ БРС API сгенерированным классом brs_pb2.Response.
 
     Структура ответа:
     - Field 1: Report (контейнер)
@@ -38,8 +80,8 @@ def decode_grpc_response(grpc_response_bytes: bytes) -> List[Dict[str, Any]]:
           - Field 2: UUID дисциплины
         - Field 2 (repeated): Score Entry
           - Field 1: UUID категории
-          - Field 2: Значение (fixed64 -> double)
-        - Field 3: Total Score (fixed64 -> double)
+          - Field 2: Значение (double)
+        - Field 3: Total Score (double)
       - Field 2 (repeated): Column Group
         - Field 1: Тип категории (int)
         - Field 2 (repeated): Column Definition
@@ -54,153 +96,137 @@ def decode_grpc_response(grpc_response_bytes: bytes) -> List[Dict[str, Any]]:
     Returns:
         Список предметов с баллами
     """
-    # Декодируем protobuf
-    message = decode_grpc_response_bytes(grpc_response_bytes, BRS_TYPEDEF)
-
-    if not message:
+    # Декодируем protobuf сгенерированным классом (upb/C++ реализация),
+    # double-поля приходят готовыми float без конвертации fixed64
+    payload = skip_grpc_header_view(grpc_response_bytes)
+    if not payload:
         logger.warning("Пустой ответ от БРС API")
         return []
 
-    # Получаем контейнер отчёта (Field 1)
-    report = get_field(message, "1", {})
-    if not report:
-        logger.warning("Не удалось найти данные отчета (Field 1)")
+    try:
+        response = brs_pb2.Response.FromString(payload)
+    except DecodeError as e:
+        logger.warning("Ошибка декодирования ответа БРС: %s", e)
         return []
 
-    rows = []
-    columns_info = {}  # uuid -> {'name': str, 'max': float}
+    if not response.HasField("report"):
+        logger.warning("Не удалось найти данные отчета (Field 1)")
+        return []
+    report = response.report
+
+    # uuid -> определение категории (Field 2 -> Field 2 в report)
+    columns_info: Dict[str, brs_pb2.Column] = {}
+    for group in report.column_groups:
+        for col in group.columns:
+            if col.uuid:
+                columns_info[col.uuid] = col
+
+    # Адаптивное создание порядка категорий: первая категория с каждым
+    # предпочтительным названием, затем остальные в порядке ответа
+    by_name: Dict[str, Tuple[str, brs_pb2.Column]] = {}
+    for uuid, col in columns_info.items():
+        by_name.setdefault(col.name, (uuid, col))
+
+    ordered_categories = [
+        by_name[cat_name] for cat_name in _PREFERRED_ORDER if cat_name in by_name
+    ]
+    seen = {uuid for uuid, _ in ordered_categories}
+    ordered_categories.extend(
+        (uuid, col) for uuid, col in columns_info.items() if uuid not in seen
+    )
+
+    # Всё, что нужно строкам от категорий, разрешаем один раз:
+    # (uuid, название, максимум) в порядке вывода и uuid -> (ключ fields, максимум)
+    categories = [
+        (uuid, col.name, float(col.max_score)) for uuid, col in ordered_categories
+    ]
+    legacy_fields = {
+        uuid: (_LEGACY_MAPPING[col.name], float(col.max_score))
+        for uuid, col in columns_info.items()
+        if col.name in _LEGACY_MAPPING
+    }
 
-    # Парсим категории (Field 2 в report)
-    column_groups = ensure_list(get_field(report, "2", []))
-    for group in column_groups:
-        if not isinstance(group, dict):
+    # Строки с предметами (Field 1 в report) сразу превращаем в результат
+    result = []
+    for row in report.rows:
+        name = row.discipline.name
+        if not name:
             continue
 
-        # Field 2 в группе - определения колонок
-        columns = ensure_list(group.get("2", []))
-        for col in columns:
-            if not isinstance(col, dict):
-                continue
-
-            col_uuid = col.get("1", "")
-            col_name = col.get("2", "")
-            col_max = col.get("4", 0)
-
-            if col_uuid:
-                columns_info[col_uuid] = {
-                    "uuid": col_uuid,
-                    "name": col_name,
-                    "max": float(col_max) if col_max else 0.0,
-                }
+        scores = {
+            entry.column_uuid: entry.value
+            for entry in row.scores
+            if entry.column_uuid
+        }
 
-    # Парсим строки с предметами (Field 1 в report)
-    discipline_rows = ensure_list(get_field(report, "1", []))
-    for row in discipline_rows:
-        if not isinstance(row, dict):
-            continue
+        # Для обратной совместимости сохраняем старый формат fields
+        fields = {}
+        for uuid, score in scores.items():
+            legacy = legacy_fields.get(uuid)
+            if legacy is not None:
+                fields[legacy[0]] = {1: score, 2: legacy[1]}
 
-        row_data = {"scores": {}}
-
-        # Discipline Info (Field 1)
-        disc_info = row.get("1", {})
-        if isinstance(disc_info, dict):
-            # Field 1 - название, Field 2 - UUID
-            row_data["name"] = disc_info.get("1", "")
-            row_data["uuid"] = disc_info.get("2", "")
-
-        # Score entries (Field 2, repeated)
-        score_entries = ensure_list(row.get("2", []))
-        for entry in score_entries:
-            if not isinstance(entry, dict):
-                continue
-
-            score_uuid = entry.get("1", "")
-            score_value = entry.get("2")
-
-            if score_uuid and score_value is not None:
-                # Конвертируем fixed64 в double
-                row_data["scores"][score_uuid] = fixed64_to_double(score_value)
-
-        # Total score (Field 3) - fixed64 -> double
-        total_value = row.get("3")
-        if total_value is not None:
-            row_data["total"] = fixed64_to_double(total_value)
-        else:
-            row_data["total"] = 0.0
-
-        if row_data.get("name"):
-            rows.append(row_data)
-
-    # Адаптивное создание порядка категорий
-    preferred_order = [
-        "Текущий контроль",
-        "Семестровый контроль",
-        "Посещения",
-        "Достижения",
-    ]
-    ordered_categories = []
+        # Добавляем общий балл
+        fields["field6"] = row.total
+
+        result.append({
+            "name": name,
+            "fields": fields,
+            # Информация о всех категориях
+            "categories": [
+                {
+                    "name": cat_name,
+                    "now": scores.get(uuid, 0.0),
+                    "max": max_score,
+                    "uuid": uuid,
+                }
+                for uuid, cat_name, max_score in categories
+            ],
+        })
 
-    # Добавляем категории из предпочтительного списка
-    for cat_name in preferred_order:
-        for uuid, col_info in columns_info.items():
-            if col_info.get("name") == cat_name:
-                ordered_categories.append((uuid, col_info))
-                break
+    logger.debug(f"Распарсено {len(result)} предметов из БРС")
+    return result
 
-    # Добавляем остальные категории
-    for uuid, col_info in columns_info.items():
-        if uuid not in [cat[0] for cat in ordered_categories]:
-            ordered_categories.append((uuid, col_info))
 
-    # Формируем результат
-    result = []
-    for row in rows:
-        item = {
-            "name": row.get("name", "Unknown"),
-            "fields": {},
-            "categories": [],
-        }
+def _extract_semester_uuid(message: Dict[str, Any]) -> str:
+    """
+    Достаёт UUID журнала из ответа GetAvailableVisitingLogsOfStudent.
 
-        # Добавляем информацию о всех категориях
-        for idx, (uuid, col_info) in enumerate(ordered_categories):
-            cat_name = col_info.get("name", "Unknown")
-            max_score = col_info.get("max", 0)
-            current_score = row.get("scores", {}).get(uuid, 0.0)
+    Args:
+        message: Декодированный ответ (Field 1 -> [0] -> Field 1 -> Field 1)
 
-            item["categories"].append({
-                "name": cat_name,
-                "now": current_score,
-                "max": max_score,
-                "uuid": uuid,
-            })
+    Returns:
+        UUID журнала первого лога
 
-        # Для обратной совместимости сохраняем старый формат fields
-        legacy_mapping = {
-            "Текущий контроль": "field2",
-            "Посещения": "field3",
-            "Достижения": "field4",
-            "Семестровый контроль": "field5",
-        }
+    Raises:
+        ValueError: Если ответ не содержит журнала
+    """
+    try:
+        return message["1"][0]["1"]["1"]
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError("Некорректный ответ со списком журналов") from e
 
-        for uuid, score in row.get("scores", {}).items():
-            col_info = columns_info.get(uuid, {})
-            cat_name = col_info.get("name", "")
-            max_score = col_info.get("max", 0)
-            field_key = legacy_mapping.get(cat_name)
 
-            if field_key:
-                item["fields"][field_key] = {
-                    1: score,
-                    2: max_score,
-                }
+def _build_points_request(semester_uuid: str) -> bytearray:
+    """
+    Собирает gRPC-Web фрейм запроса баллов в одном буфере.
 
-        # Добавляем общий балл
-        item["fields"]["field6"] = row.get("total", 0.0)
+    Args:
+        semester_uuid: UUID журнала семестра (короче 128 байт)
 
-        result.append(item)
+    Returns:
+        Тело запроса: [flags][длина BE][0x0A][длина UUID][UUID]
+    """
+    uuid_bytes = semester_uuid.encode("utf-8")
+    uuid_len = len(uuid_bytes)
+    if uuid_len > 0x7F:
+        raise ValueError("UUID не помещается в однобайтовый varint")
 
-    logger.debug(f"Распарсено {len(result)} предметов из БРС")
-    return result
+    buf = bytearray(7 + uuid_len)
+    # gRPC-Web header (флаг 0x00 + длина payload) и Field 1 (String)
+    _POINTS_FRAME_PREFIX.pack_into(buf, 0, 0x00, 2 + uuid_len, 0x0A, uuid_len)
+    buf[7:] = uuid_bytes
+    return buf
 
 
 def fill_missing_fields(fields_dict: Dict) -> Dict:
@@ -245,57 +271,44 @@ async def _get_points(
         Exception: При ошибках запроса
     """
     try:
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
         logger.info("[БРС API] Запрос к API БРС")
         url = "https://attendance.mirea.ru/rtu_tc.attendance.api.LearnRatingScoreService/GetLearnRatingScoreReportForStudentInVisitingLogV2"
 
-        SEMESTR_UUID = await _query_get_group(
-            cookies, tg_user_id, db, user_agent
+        SEMESTR_UUID = (
+            _semester_uuid_cache.get(tg_user_id) if tg_user_id is not None else None
         )
-        SEMESTR_UUID = SEMESTR_UUID.get("1")[0].get("1").get("1")
-
-        uuid_bytes = SEMESTR_UUID.encode("utf-8")
-        # Protobuf: Field 1 (String) = STUDENT_UUID
-        payload = bytes([0x0A, len(uuid_bytes)]) + uuid_bytes
-        # gRPC-Web header: 0x00 (compressed flag) + 4 bytes length (big endian)
-        grpc_header = bytes([0x00]) + struct.pack(">I", len(payload))
-        request_body = grpc_header + payload
-
-        headers = {
-            "Content-Type": "application/grpc-web+proto",
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
-            "pulse-app-type": "pulse-app",
-            "pulse-app-version": "1.6.0+5256",
-            "x-grpc-web": "1",
-            "x-requested-with": "XMLHttpRequest",
-            "Origin": "https://attendance-app.mirea.ru",
-            "Referer": "https://attendance-app.mirea.ru/",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-site",
+        if SEMESTR_UUID is None:
+            SEMESTR_UUID = _extract_semester_uuid(
+                await _query_get_group(cookies, tg_user_id, db, user_agent)
+            )
+            if tg_user_id is not None:
+                _semester_uuid_cache.set(tg_user_id, SEMESTR_UUID)
+
+        request_body = _build_points_request(SEMESTR_UUID)
+
+        headers = _POINTS_HEADERS_BASE | {
             "User-Agent": (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             ),
+            # Общая сессия куки не хранит, передаём их явно
+            "Cookie": build_cookie_header(cookies),
         }
 
-        async with aiohttp.ClientSession() as session:
-            session.cookie_jar.update_cookies(cookies_dict)
-            async with session.post(
-                url,
-                data=request_body,
-                headers=headers,
-                timeout=4,
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"Ошибка запроса к {url}. Код: {response.status}")
-                response_bytes = await response.read()
-
-                logger.info(f"[БРС API] Получен ответ. Статус: {response.status}")
-                logger.debug(f"[БРС API] Длина ответа: {len(response_bytes)} байт")
+        session = await get_session()
+        async with session.post(
+            url,
+            data=request_body,
+            headers=headers,
+            timeout=4,
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Ошибка запроса к {url}. Код: {response.status}")
+            response_bytes = await response.read()
+
+            logger.info(f"[БРС API] Получен ответ. Статус: {response.status}")
+            logger.debug(f"[БРС API] Длина ответа: {len(response_bytes)} байт")
 
         return [response_bytes]
 
@@ -0,0 +1,114 @@
+"""
+Общий HTTP-пул для запросов к MIREA API.
+
+Все модули mirea_api ходят на одни и те же хосты (attendance.mirea.ru),
+поэтому соединения держатся в одном TCPConnector и переиспользуются между
+запросами вместо нового TCP+TLS рукопожатия на каждый вызов.
+
+Общая сессия не хранит куки (DummyCookieJar): куки разных пользователей
+передаются явным заголовком Cookie в каждом запросе.
+"""
+
+import logging
+from functools import lru_cache
+from operator import itemgetter
+from typing import Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Таймаут по умолчанию для запросов через общую сессию (секунды)
+DEFAULT_TIMEOUT_SECONDS = 15
+
+_COOKIE_NAME_VALUE = itemgetter("name", "value")
+
+_connector: Optional[aiohttp.TCPConnector] = None
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_connector() -> aiohttp.TCPConnector:
+    """
+    Возвращает общий пул соединений, создавая его при первом вызове.
+
+    Сессии с собственным CookieJar (например, в get_lesson_attendance)
+    используют этот же пул с connector_owner=False.
+
+    Returns:
+        Общий TCPConnector
+    """
+    global _connector
+    if _connector is None or _connector.closed:
+        _connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=32,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True,
+        )
+    return _connector
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую сессию без хранения куки, создавая её при первом вызове.
+
+    Сессию не нужно закрывать после запроса: она закрывается при остановке
+    приложения через close_session.
+
+    Returns:
+        Общая сессия aiohttp
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=get_connector(),
+            connector_owner=False,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT_SECONDS),
+            trust_env=False,
+        )
+    return _session
+
+
+async def close_session() -> None:
+    """Закрывает общую сессию и пул соединений."""
+    global _session, _connector
+    if _session is not None:
+        await _session.close()
+        _session = None
+    if _connector is not None:
+        await _connector.close()
+        _connector = None
+        logger.info("HTTP пул MIREA API закрыт")
+
+
+@lru_cache(maxsize=1024)
+def _join_cookie_pairs(pairs: Tuple[Tuple[str, str], ...]) -> str:
+    """Склеивает пары (имя, значение) в значение заголовка Cookie."""
+    return "; ".join(f"{name}={value}" for name, value in pairs)
+
+
+def build_cookie_header(cookies: list) -> str:
+    """
+    Собирает заголовок Cookie из списка куки пользователя.
+
+    Куки пользователя не меняются между запросами до переавторизации,
+    поэтому готовая строка кешируется по набору пар (имя, значение).
+
+    Args:
+        cookies: Список куки в виде словарей с ключами name и value
+
+    Returns:
+        Значение заголовка Cookie
+    """
+    return _join_cookie_pairs(tuple(map(_COOKIE_NAME_VALUE, cookies)))
+
+
+__all__ = [
+    "DEFAULT_TIMEOUT_SECONDS",
+    "build_cookie_header",
+    "close_session",
+    "get_connector",
+    "get_session",
+]
@@ -16,9 +16,42 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, Optional
 
 from backend.mirea_api.get_lesson_attendance import get_lesson_attendance_data
+from backend.mirea_api.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Время жизни копии кеша группы в памяти процесса (секунды): данные в БД
+# обновляются раз в месяц, а читаются на каждый запрос посещаемости
+MEMORY_CACHE_TTL_SECONDS = 3600
+# Максимальное количество групп в кеше в памяти
+_MEMORY_CACHE_MAX_SIZE = 4096
+
+# {group_name: subjects_data}; параллельные промахи по группе ждут первый запрос к БД
+_memory_cache = TTLCache(MEMORY_CACHE_TTL_SECONDS, _MEMORY_CACHE_MAX_SIZE)
+
+
+# json.dumps с нестандартными параметрами создаёт новый JSONEncoder на каждый
+# вызов; компактные разделители уменьшают размер строки в БД
+_SUBJECTS_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+# SQL держим константами: asyncpg кеширует подготовленные выражения на каждом
+# соединении пула по тексту запроса, поэтому повторные вызовы не парсятся и не
+# планируются сервером заново
+_SELECT_CACHE_SQL = """
+    SELECT subjects_data, last_updated
+    FROM lessons_cost_cache
+    WHERE group_name = $1
+"""
+
+_UPSERT_CACHE_SQL = """
+    INSERT INTO lessons_cost_cache (group_name, subjects_data, last_updated)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (group_name)
+    DO UPDATE SET
+        subjects_data = EXCLUDED.subjects_data,
+        last_updated = EXCLUDED.last_updated
+"""
+
 
 class LessonsCostCache:
     """Класс для работы с кешем стоимости посещений"""
@@ -28,6 +61,27 @@ class LessonsCostCache:
         """
         Получить кеш из БД для группы.
 
+        Найденный кеш хранится в памяти процесса MEMORY_CACHE_TTL_SECONDS,
+        а параллельные промахи по одной группе ждут единственный запрос к БД.
+        Возвращаемый словарь общий для всех вызовов - не изменяйте его.
+
+        Args:
+            db: Объект подключения к базе данных
+            group_name: Название группы
+
+        Returns:
+            Словарь {название_предмета: количество_пар} или None если кеша нет или он устарел
+        """
+        return await _memory_cache.get_or_load(
+            group_name,
+            lambda: LessonsCostCache._read_cache_from_db(db, group_name),
+        )
+
+    @staticmethod
+    async def _read_cache_from_db(db, group_name: str) -> Optional[Dict[str, int]]:
+        """
+        Прочитать кеш группы из БД.
+
         Args:
             db: Объект подключения к базе данных
             group_name: Название группы
@@ -37,14 +91,7 @@ class LessonsCostCache:
         """
         try:
             # Получаем кеш из БД
-            result = await db.pool.fetchrow(
-                """
-                SELECT subjects_data, last_updated
-                FROM lessons_cost_cache
-                WHERE group_name = $1
-                """,
-                group_name,
-            )
+            result = await db.pool.fetchrow(_SELECT_CACHE_SQL, group_name)
 
             if not result:
                 logger.info(f"Кеш для группы {group_name} не найден")
@@ -87,22 +134,11 @@ class LessonsCostCache:
         """
         try:
             now = datetime.now(timezone.utc)
-            subjects_json = json.dumps(subjects_data, ensure_ascii=False)
+            subjects_json = _SUBJECTS_ENCODER.encode(subjects_data)
 
             # Используем UPSERT (INSERT ... ON CONFLICT)
-            await db.pool.execute(
-                """
-                INSERT INTO lessons_cost_cache (group_name, subjects_data, last_updated)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (group_name)
-                DO UPDATE SET
-                    subjects_data = EXCLUDED.subjects_data,
-                    last_updated = EXCLUDED.last_updated
-                """,
-                group_name,
-                subjects_json,
-                now,
-            )
+            await db.pool.execute(_UPSERT_CACHE_SQL, group_name, subjects_json, now)
+            _memory_cache.set(group_name, subjects_data)
 
             logger.info(
                 f"Кеш обновлён для группы {group_name} ({len(subjects_data)} предметов)"
@@ -174,12 +210,10 @@ class LessonsCostCache:
                 total_lessons = result[0]["total_lessons"]
                 logger.info(f"Получено от API: {total_lessons} пар")
 
-                # Обновляем кеш
-                if cache is None:
-                    cache = {}
-
-                cache[subject_name] = total_lessons
-                await LessonsCostCache.update_cache_in_db(db, group_name, cache)
+                # Обновляем кеш (новым словарём: прочитанный кеш общий)
+                await LessonsCostCache.update_cache_in_db(
+                    db, group_name, {**(cache or {}), subject_name: total_lessons}
+                )
 
                 return total_lessons
 
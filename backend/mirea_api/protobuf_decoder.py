@@ -17,13 +17,12 @@ MIREA Attendance API - Protobuf Decoder
     message = decode_grpc_response(base64_response, ME_INFO_TYPEDEF)
 """
 
+import asyncio
 import base64
 import logging
 import struct
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional, Union
-
-import blackboxprotobuf
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 
 # Реэкспорт схем для обратной совместимости
 from backend.mirea_api.protobuf_schemas import (
@@ -41,6 +40,32 @@ logger = logging.getLogger(__name__)
 # Московский часовой пояс
 MOSCOW_TZ = timezone(timedelta(hours=3))
 
+# Длина payload в gRPC-Web заголовке (big-endian uint32)
+_UINT32_BE = struct.Struct(">I")
+
+# blackboxprotobuf импортируется при первом декодировании без быстрой схемы
+_blackbox: Optional[Tuple[Callable[..., Any], Type[Exception]]] = None
+
+
+def _get_blackbox() -> Tuple[Callable[..., Any], Type[Exception]]:
+    """
+    Лениво импортирует blackboxprotobuf.
+
+    Большинство ответов декодируется через decode_message_fast или
+    сгенерированные protobuf классы, поэтому библиотека нужна только
+    для запасного пути и не загружается при импорте модуля.
+
+    Returns:
+        Кортеж (decode_message, BlackboxProtobufException)
+    """
+    global _blackbox
+    if _blackbox is None:
+        import blackboxprotobuf
+        from blackboxprotobuf.lib.exceptions import BlackboxProtobufException
+
+        _blackbox = (blackboxprotobuf.decode_message, BlackboxProtobufException)
+    return _blackbox
+
 
 # =============================================================================
 # gRPC-Web Header Processing
@@ -68,7 +93,7 @@ def skip_grpc_header(data: bytes) -> bytes:
 
     # 0x00 - data frame
     if data[0] == 0x00:
-        length = int.from_bytes(data[1:5], "big")
+        length = _UINT32_BE.unpack_from(data, 1)[0]
         if length == 0:
             return b""
         if 5 + length <= len(data):
@@ -77,6 +102,79 @@ def skip_grpc_header(data: bytes) -> bytes:
     return data
 
 
+def skip_grpc_header_view(data: bytes) -> Union[bytes, memoryview]:
+    """
+    Как skip_grpc_header, но возвращает payload как memoryview без копирования.
+
+    Подходит для декодеров, принимающих buffer protocol (сгенерированные
+    protobuf классы); blackboxprotobuf и decode_message_fast ждут bytes.
+
+    Args:
+        data: Raw bytes ответа от API
+
+    Returns:
+        Protobuf payload без заголовка
+    """
+    if len(data) < 5 or data[0] == 0x80:
+        return b""
+
+    if data[0] == 0x00:
+        length = _UINT32_BE.unpack_from(data, 1)[0]
+        if length == 0:
+            return b""
+        if 5 + length <= len(data):
+            return memoryview(data)[5 : 5 + length]
+
+    return data
+
+
+async def read_grpc_payload(response: Any) -> bytes:
+    """
+    Читает payload первого gRPC-Web фрейма прямо из потока ответа aiohttp.
+
+    Заголовок и тело читаются через readexactly, без промежуточного
+    буфера всего ответа (read() + срез в skip_grpc_header). Остаток тела
+    (trailer-фрейм) дочитывается, чтобы соединение вернулось в пул.
+
+    Args:
+        response: Ответ aiohttp (aiohttp.ClientResponse)
+
+    Returns:
+        Protobuf payload без заголовка (b"" для пустого или обрезанного ответа)
+    """
+    stream = response.content
+    try:
+        header = await stream.readexactly(5)
+    except asyncio.IncompleteReadError:
+        return b""
+
+    flags, length = struct.unpack(">BI", header)
+
+    # 0x80 - trailer frame (пустой ответ, только grpc-status)
+    if flags == 0x80:
+        await stream.read()
+        return b""
+
+    # Не gRPC-Web фрейм - отдаём ответ целиком, как skip_grpc_header
+    if flags != 0x00:
+        return header + await stream.read()
+
+    if length == 0:
+        await stream.read()
+        return b""
+
+    try:
+        payload = await stream.readexactly(length)
+    except asyncio.IncompleteReadError:
+        logger.warning("Обрезанный gRPC-Web фрейм: ожидалось %d байт", length)
+        return b""
+
+    # Дочитываем trailer-фрейм (несколько байт), иначе aiohttp закроет
+    # соединение с недочитанным телом вместо возврата его в пул
+    await stream.read()
+    return payload
+
+
 # =============================================================================
 # Protobuf Decoding
 # =============================================================================
@@ -103,15 +201,18 @@ def decode_grpc_response(
             logger.debug("Пустой ответ от API")
             return {}
 
+        decode_message, schema_error = _get_blackbox()
+
         if typedef:
             try:
-                message, _ = blackboxprotobuf.decode_message(content, typedef)
+                message, _ = decode_message(content, typedef)
                 return message
-            except Exception as e:
-                logger.warning(f"Ошибка декодирования со схемой: {e}")
+            except schema_error as e:
+                # Без схемы повторяем только при несовпадении данных со схемой
+                logger.warning("Ошибка декодирования со схемой: %s", e)
 
         # Декодируем без схемы
-        message, _ = blackboxprotobuf.decode_message(content)
+        message, _ = decode_message(content)
         return message
 
     except Exception as e:
@@ -119,35 +220,36 @@ def decode_grpc_response(
         return {}
 
 
-def decode_grpc_response_bytes(
-    content: bytes,
+def decode_protobuf_payload(
+    data: bytes,
     typedef: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
-    Декодирует raw bytes gRPC-Web ответ в dict.
+    Декодирует protobuf payload (без gRPC-Web заголовка) в dict.
 
     Args:
-        content: Raw bytes ответа от API
+        data: Protobuf payload
         typedef: Опциональная схема protobuf
 
     Returns:
         Декодированное сообщение как dict
     """
     try:
-        data = skip_grpc_header(content)
-
         if not data or len(data) < 2:
             logger.debug("Пустой ответ от API")
             return {}
 
+        decode_message, schema_error = _get_blackbox()
+
         if typedef:
             try:
-                message, _ = blackboxprotobuf.decode_message(data, typedef)
+                message, _ = decode_message(data, typedef)
                 return message
-            except Exception as e:
-                logger.warning(f"Ошибка декодирования со схемой: {e}")
+            except schema_error as e:
+                # Без схемы повторяем только при несовпадении данных со схемой
+                logger.warning("Ошибка декодирования со схемой: %s", e)
 
-        message, _ = blackboxprotobuf.decode_message(data)
+        message, _ = decode_message(data)
         return message
 
     except Exception as e:
@@ -155,6 +257,262 @@ def decode_grpc_response_bytes(
         return {}
 
 
+def decode_grpc_response_bytes(
+    content: bytes,
+    typedef: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Декодирует raw bytes gRPC-Web ответ в dict.
+
+    Args:
+        content: Raw bytes ответа от API
+        typedef: Опциональная схема protobuf
+
+    Returns:
+        Декодированное сообщение как dict
+    """
+    return decode_protobuf_payload(skip_grpc_header(content), typedef)
+
+
+# =============================================================================
+# Fast Typedef-Driven Decoding
+# =============================================================================
+
+# Wire types protobuf
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_FIXED32 = 5
+
+# Ожидаемый wire type для каждого типа поля из typedef
+_FIELD_WIRE_TYPES = {
+    "int": _WIRE_VARINT,
+    "uint": _WIRE_VARINT,
+    "sint": _WIRE_VARINT,
+    "string": _WIRE_LENGTH_DELIMITED,
+    "bytes": _WIRE_LENGTH_DELIMITED,
+    "message": _WIRE_LENGTH_DELIMITED,
+    "fixed64": _WIRE_FIXED64,
+    "sfixed64": _WIRE_FIXED64,
+    "double": _WIRE_FIXED64,
+    "fixed32": _WIRE_FIXED32,
+    "sfixed32": _WIRE_FIXED32,
+    "float": _WIRE_FIXED32,
+}
+
+
+# Предкомпилированные форматы для приведения fixed64/fixed32 к double/float
+_PACK_U64 = struct.Struct("<Q").pack
+_UNPACK_F64 = struct.Struct("<d").unpack
+_PACK_U32 = struct.Struct("<I").pack
+_UNPACK_F32 = struct.Struct("<f").unpack
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Читает varint начиная с pos. Возвращает (значение, новая_позиция)."""
+    result = 0
+    shift = 0
+    end = len(data)
+    while True:
+        if pos >= end:
+            raise ValueError("Обрезанный varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 70:
+            raise ValueError("Слишком длинный varint")
+
+
+# Скомпилированная схема: ({тег: (номер поля, тип, скомпилированная вложенная схема)}, номера полей)
+_CompiledTypedef = Tuple[Dict[int, Tuple[str, str, Any]], frozenset]
+
+# Кеш скомпилированных схем по id typedef; typedef хранится рядом, чтобы id не переиспользовался
+_compiled_typedefs: Dict[int, Tuple[Dict[str, Any], _CompiledTypedef]] = {}
+
+
+def _compile_typedef(typedef: Dict[str, Any]) -> _CompiledTypedef:
+    """
+    Возвращает скомпилированную схему для decode_message_fast.
+
+    Поля индексируются по полному тегу (номер поля << 3 | wire type), поэтому
+    при декодировании не нужно строить строковый номер поля и отдельно
+    сверять wire type. Схемы - константы модулей, результат кешируется.
+
+    Args:
+        typedef: Схема сообщения
+
+    Returns:
+        Кортеж (поля по тегу, номера полей из схемы)
+    """
+    cached = _compiled_typedefs.get(id(typedef))
+    if cached is not None and cached[0] is typedef:
+        return cached[1]
+
+    by_tag: Dict[int, Tuple[str, str, Any]] = {}
+    for field_number, field_def in typedef.items():
+        field_type = field_def.get("type")
+        wire_type = _FIELD_WIRE_TYPES.get(field_type)
+        if wire_type is None:
+            # Тип не поддерживается: поле в схеме есть, но тег не совпадёт ни с одним
+            continue
+        sub_compiled = (
+            _compile_typedef(field_def.get("message_typedef", {}))
+            if field_type == "message"
+            else None
+        )
+        by_tag[(int(field_number) << 3) | wire_type] = (field_number, field_type, sub_compiled)
+
+    compiled = (by_tag, frozenset(int(field_number) for field_number in typedef))
+    _compiled_typedefs[id(typedef)] = (typedef, compiled)
+    return compiled
+
+
+def _convert_field(value: Any, field_type: str, sub_compiled: Any) -> Any:
+    """Приводит сырое значение поля к типу из typedef (как blackboxprotobuf)."""
+    if field_type == "message":
+        return _decode_compiled(value, sub_compiled)
+    if field_type == "string":
+        return value.decode("utf-8")
+    if field_type == "bytes":
+        return value
+    if field_type == "int" or field_type == "sfixed64":
+        return value - (1 << 64) if value >= (1 << 63) else value
+    if field_type == "sfixed32":
+        return value - (1 << 32) if value >= (1 << 31) else value
+    if field_type == "sint":
+        return (value >> 1) ^ -(value & 1)
+    if field_type == "double":
+        return _UNPACK_F64(_PACK_U64(value))[0]
+    if field_type == "float":
+        return _UNPACK_F32(_PACK_U32(value))[0]
+    # uint, fixed64, fixed32
+    return value
+
+
+def decode_message_fast(data: bytes, typedef: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Декодирует protobuf сообщение строго по схеме, без blackboxprotobuf.
+
+    Результат имеет ту же форму, что и blackboxprotobuf.decode_message:
+    ключи — номера полей строками, повторённое поле становится списком.
+    Поля, которых нет в typedef, пропускаются (парсерам они не нужны).
+
+    Args:
+        data: Protobuf payload без gRPC-Web заголовка
+        typedef: Схема сообщения
+
+    Returns:
+        Декодированное сообщение как dict
+
+    Raises:
+        ValueError: Если данные не соответствуют схеме или повреждены
+    """
+    return _decode_compiled(data, _compile_typedef(typedef))
+
+
+def _decode_compiled(data: bytes, compiled: _CompiledTypedef) -> Dict[str, Any]:
+    """Декодирует protobuf сообщение по скомпилированной схеме (см. decode_message_fast)."""
+    by_tag, field_numbers = compiled
+    message: Dict[str, Any] = {}
+    pos = 0
+    end = len(data)
+
+    while pos < end:
+        key, pos = _read_varint(data, pos)
+        wire_type = key & 0x07
+
+        if wire_type == _WIRE_VARINT:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == _WIRE_LENGTH_DELIMITED:
+            length, pos = _read_varint(data, pos)
+            if pos + length > end:
+                raise ValueError("Обрезанное length-delimited поле")
+            value = data[pos : pos + length]
+            pos += length
+        elif wire_type == _WIRE_FIXED64:
+            if pos + 8 > end:
+                raise ValueError("Обрезанное fixed64 поле")
+            value = int.from_bytes(data[pos : pos + 8], "little")
+            pos += 8
+        elif wire_type == _WIRE_FIXED32:
+            if pos + 4 > end:
+                raise ValueError("Обрезанное fixed32 поле")
+            value = int.from_bytes(data[pos : pos + 4], "little")
+            pos += 4
+        else:
+            raise ValueError(f"Неподдерживаемый wire type: {wire_type}")
+
+        entry = by_tag.get(key)
+        if entry is None:
+            if key >> 3 in field_numbers:
+                raise ValueError(f"Поле {key >> 3}: wire type {wire_type} не совпадает со схемой")
+            continue
+
+        field_number, field_type, sub_compiled = entry
+        value = _convert_field(value, field_type, sub_compiled)
+
+        if field_number not in message:
+            message[field_number] = value
+        else:
+            existing = message[field_number]
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                message[field_number] = [existing, value]
+
+    return message
+
+
+def decode_protobuf_payload_fast(
+    data: bytes,
+    typedef: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Декодирует protobuf payload (без gRPC-Web заголовка) по схеме
+    через decode_message_fast.
+
+    Если payload не укладывается в схему, используется blackboxprotobuf
+    (decode_protobuf_payload).
+
+    Args:
+        data: Protobuf payload
+        typedef: Схема protobuf
+
+    Returns:
+        Декодированное сообщение как dict
+    """
+    if not data or len(data) < 2:
+        logger.debug("Пустой ответ от API")
+        return {}
+
+    try:
+        return decode_message_fast(data, typedef)
+    except ValueError as e:
+        logger.debug("Быстрое декодирование не удалось, fallback: %s", e)
+
+    return decode_protobuf_payload(data, typedef)
+
+
+def decode_grpc_response_bytes_fast(
+    content: bytes,
+    typedef: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Декодирует raw bytes gRPC-Web ответ по схеме через decode_message_fast.
+
+    Args:
+        content: Raw bytes ответа от API
+        typedef: Схема protobuf
+
+    Returns:
+        Декодированное сообщение как dict
+    """
+    return decode_protobuf_payload_fast(skip_grpc_header(content), typedef)
+
+
 # =============================================================================
 # Helper Functions
 # =============================================================================
@@ -173,6 +531,19 @@ def ensure_list(value: Any) -> List[Any]:
     return [value]
 
 
+def ensure_dict_list(value: Any) -> List[Dict[str, Any]]:
+    """
+    Как ensure_list, но оставляет только вложенные сообщения (dict).
+
+    Заменяет связку ensure_list + проверку isinstance(item, dict) в цикле.
+    """
+    if isinstance(value, list):
+        return [item for item in value if isinstance(item, dict)]
+    if isinstance(value, dict):
+        return [value]
+    return []
+
+
 def get_field(data: Dict[str, Any], key: str, default: Any = None) -> Any:
     """
     Безопасно получает поле из dict, учитывая альтернативные ключи blackboxprotobuf.
@@ -252,18 +623,17 @@ def fixed64_to_double(value: Union[int, bytes]) -> float:
 
     Example:
         >>> fixed64_to_double(4626322717216342016)
-        40.0
+        20.0
     """
-    if isinstance(value, bytes):
-        if len(value) == 8:
-            return struct.unpack('<d', value)[0]
-        return 0.0
     if isinstance(value, int):
         try:
-            b = struct.pack('<Q', value)  # unsigned long long (8 bytes)
-            return struct.unpack('<d', b)[0]
+            return _UNPACK_F64(_PACK_U64(value))[0]
         except struct.error:
             return 0.0
+    if isinstance(value, bytes):
+        if len(value) == 8:
+            return _UNPACK_F64(value)[0]
+        return 0.0
     return 0.0
 
 
@@ -290,6 +660,14 @@ def timestamp_to_datetime(ts: int) -> Optional[datetime]:
 # FIO (Name) Formatting
 # =============================================================================
 
+def _clean_name_part(name: str) -> str:
+    """Оставляет в части ФИО только буквы и пробельные символы."""
+    # Обычное имя из одного слова проверяется целиком на уровне C
+    if name.isalpha():
+        return name
+    return "".join(c for c in name if c.isalpha() or c.isspace()).strip()
+
+
 def format_fio(
     first_name: str = "",
     last_name: str = "",
@@ -315,9 +693,9 @@ def format_fio(
         "Иванов Иван Иванович"
     """
     # Очищаем от непечатных символов
-    first_name = "".join(c for c in first_name if c.isalpha() or c.isspace()).strip()
-    last_name = "".join(c for c in last_name if c.isalpha() or c.isspace()).strip()
-    patronymic = "".join(c for c in patronymic if c.isalpha() or c.isspace()).strip()
+    first_name = _clean_name_part(first_name)
+    last_name = _clean_name_part(last_name)
+    patronymic = _clean_name_part(patronymic)
 
     if short:
         if last_name and first_name:
@@ -381,10 +759,17 @@ __all__ = [
     "MOSCOW_TZ",
     # gRPC functions
     "skip_grpc_header",
+    "skip_grpc_header_view",
+    "read_grpc_payload",
     "decode_grpc_response",
+    "decode_protobuf_payload",
     "decode_grpc_response_bytes",
+    "decode_message_fast",
+    "decode_protobuf_payload_fast",
+    "decode_grpc_response_bytes_fast",
     # Helpers
     "ensure_list",
+    "ensure_dict_list",
     "get_field",
     "get_nested",
     # Conversions
@@ -10,16 +10,40 @@ TODO: Получить реальные protobuf схемы для SelfApproveAt
 """
 
 import logging
+import re
+import struct
 from typing import Optional
 
-import aiohttp
-
 from backend.database import DBModel
+from backend.mirea_api.http_session import build_cookie_header, get_session
 
-from .get_cookies import generate_random_mobile_user_agent
+from .get_cookies import get_user_agent
 
 logger = logging.getLogger(__name__)
 
+# Русский текст в UTF-8: пары байт 0xD0/0xD1 + второй байт, внутри - пробелы и дефисы
+_CYRILLIC_RUN_RE = re.compile(rb"[\xD0\xD1].(?:[\xD0\xD1].|[ \-])*", re.DOTALL)
+
+# Статические заголовки запросов SelfApproveAttendance (User-Agent добавляется на каждый вызов)
+_SELF_APPROVE_HEADERS_BASE = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
+    "Content-Type": "application/grpc-web+proto",
+    "pulse-app-type": "pulse-app",
+    "pulse-app-version": "1.6.0+5256",
+    "Origin": "https://attendance-app.mirea.ru",
+    "Referer": "https://attendance-app.mirea.ru/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+    "x-grpc-web": "1",
+    "x-requested-with": "XMLHttpRequest",
+}
+
+# Префикс фрейма запроса: флаги, длина payload, тег и длина Field 1
+_GUID_FRAME_PREFIX = struct.Struct(">BIBB")
+
 
 def encode_guid(guid: str) -> bytes:
     """
@@ -33,11 +57,8 @@ def encode_guid(guid: str) -> bytes:
     """
     guid_bytes = guid.encode("ascii")
     guid_length = len(guid_bytes)
-    proto_message = bytes([0x0A, guid_length]) + guid_bytes
-    total_length = len(proto_message)
-    # gRPC-web header: 1 byte flags (0x00) + 4 bytes length (big-endian)
-    final_bytes = b"\x00" + total_length.to_bytes(4, 'big') + proto_message
-    return final_bytes
+    # gRPC-web header (флаг 0x00 + длина payload) и Field 1 (String)
+    return _GUID_FRAME_PREFIX.pack(0x00, 2 + guid_length, 0x0A, guid_length) + guid_bytes
 
 
 def decode_grpc_response(response_bytes: bytes) -> str:
@@ -54,37 +75,13 @@ def decode_grpc_response(response_bytes: bytes) -> str:
     # Пропускаем header и извлекаем все UTF-8 строки из protobuf
 
     result_parts = []
-    i = 5  # Пропускаем gRPC-web header
-
-    while i < len(response_bytes):
-        # Ищем начало UTF-8 строки (русские буквы начинаются с 0xD0 или 0xD1)
-        if i + 1 < len(response_bytes) and response_bytes[i] in (0xD0, 0xD1):
-            # Пытаемся извлечь русскую строку
-            start = i
-            while i < len(response_bytes):
-                # Русские UTF-8 символы: 0xD0-0xD1 + второй байт, или пробел, или дефис
-                if response_bytes[i] in (0xD0, 0xD1) and i + 1 < len(response_bytes):
-                    i += 2
-                elif response_bytes[i] in (0x20, 0x2D):  # пробел или дефис
-                    i += 1
-                else:
-                    break
-
-            if i > start:
-                try:
-                    text = response_bytes[start:i].decode("utf-8", errors="ignore")
-                    if len(text) > 1:  # Минимум 2 символа
-                        result_parts.append(text.strip())
-                except Exception:
-                    pass
-        else:
-            i += 1
+    for match in _CYRILLIC_RUN_RE.finditer(response_bytes, 5):  # Пропускаем gRPC-web header
+        text = match.group().decode("utf-8", errors="ignore")
+        if len(text) > 1:  # Минимум 2 символа
+            result_parts.append(text.strip())
 
     # Возвращаем уникальные части через разделитель
-    unique_parts = []
-    for part in result_parts:
-        if part and part not in unique_parts:
-            unique_parts.append(part)
+    unique_parts = list(dict.fromkeys(part for part in result_parts if part))
 
     return (
         " | ".join(unique_parts)
@@ -117,50 +114,30 @@ async def send_self_approve_attendance(
         encoded_token = encode_guid(token)
 
         url = "https://attendance.mirea.ru/rtu_tc.attendance.api.StudentService/SelfApproveAttendance"
-
-        headers = {
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3",
-            "Content-Type": "application/grpc-web+proto",
-            "pulse-app-type": "pulse-app",
-            "pulse-app-version": "1.6.0+5256",
-            "Origin": "https://attendance-app.mirea.ru",
-            "Referer": "https://attendance-app.mirea.ru/",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-site",
+        headers = _SELF_APPROVE_HEADERS_BASE | {
             "User-Agent": (
                 user_agent
                 if user_agent is not None
-                else generate_random_mobile_user_agent()
+                else get_user_agent(tg_user_id)
             ),
-            "x-grpc-web": "1",
-            "x-requested-with": "XMLHttpRequest",
+            # Общая сессия куки не хранит, передаём их явно
+            "Cookie": build_cookie_header(cookies),
         }
 
-        async def do_request(session: aiohttp.ClientSession):
-            async with session.post(
-                url,
-                data=encoded_token,
-                headers=headers,
-            ) as response:
-                status = response.status
-                response_bytes = await response.read()
-                return status, response_bytes
-
-        async with aiohttp.ClientSession() as session:
-
-            # Устанавливаем переданные куки
-            cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies}
-            session.cookie_jar.update_cookies(cookies_dict)
-
-            status, response_bytes = await do_request(session)
-            # Если получен статус 401 – выбрасываем ошибку для обработки вызывающим кодом
-            if status == 401:
-                raise Exception("Ошибка 401: Unauthorized. Проверьте переданные куки.")
-            if status != 200:
-                raise Exception(f"Ошибка запроса, код: {status}")
+        session = await get_session()
+        async with session.post(
+            url,
+            data=encoded_token,
+            headers=headers,
+        ) as response:
+            status = response.status
+            response_bytes = await response.read()
+
+        # Если получен статус 401 – выбрасываем ошибку для обработки вызывающим кодом
+        if status == 401:
+            raise Exception("Ошибка 401: Unauthorized. Проверьте переданные куки.")
+        if status != 200:
+            raise Exception(f"Ошибка запроса, код: {status}")
 
         logger.debug(f"RAW gRPC response_bytes length: {len(response_bytes)}")
 
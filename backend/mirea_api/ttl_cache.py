@@ -0,0 +1,149 @@
+"""
+Кеш в памяти процесса с временем жизни записей.
+
+Используется модулями mirea_api для коротких кешей ответов MIREA API и БД:
+записи хранятся как {ключ: (expires_at, значение)} по time.monotonic,
+а параллельные промахи по одному ключу ждут единственную загрузку.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру словарь с временем жизни записей.
+
+    Пустые значения (None, пустые коллекции и строки) не сохраняются, чтобы
+    неудачный запрос не закешировался. При достижении max_size из кеша
+    вычищаются протухшие записи, а если их нет - самые старые.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int,
+        *,
+        keep_stale: bool = False,
+        sweep_on_set: bool = False,
+    ) -> None:
+        """
+        Args:
+            ttl: Время жизни записи по умолчанию (секунды)
+            max_size: Максимальное количество записей
+            keep_stale: Не удалять протухшие записи при чтении, чтобы их можно
+                было получить через get(..., allow_stale=True)
+            sweep_on_set: Вычищать протухшие записи при каждой записи, а не
+                только при достижении max_size (для небольших кешей крупных
+                значений)
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._keep_stale = keep_stale
+        self._sweep_on_set = sweep_on_set
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, allow_stale: bool = False) -> Optional[Any]:
+        """
+        Возвращает значение или None, если его нет или оно устарело.
+
+        Args:
+            key: Ключ записи
+            allow_stale: Вернуть значение и после истечения времени жизни
+
+        Returns:
+            Сохранённое значение или None
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if allow_stale or expires_at > time.monotonic():
+            return value
+        if not self._keep_stale:
+            del self._data[key]
+        return None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Сохраняет непустое значение на ttl секунд (по умолчанию self.ttl).
+
+        Args:
+            key: Ключ записи
+            value: Значение
+            ttl: Время жизни записи (секунды)
+        """
+        if not value:
+            return
+        data = self._data
+        now = time.monotonic()
+        # Перезапись ключа переносит его в конец порядка вытеснения
+        data.pop(key, None)
+        if self._sweep_on_set or len(data) >= self.max_size:
+            for stale_key in [k for k, (exp, _) in data.items() if exp <= now]:
+                del data[stale_key]
+            while len(data) >= self.max_size:
+                del data[next(iter(data))]
+        data[key] = (now + (self.ttl if ttl is None else ttl), value)
+
+    def pop(self, key: Hashable) -> None:
+        """Удаляет запись, если она есть."""
+        self._data.pop(key, None)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        *,
+        refresh: bool = False,
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Возвращает значение из кеша или загружает его через loader.
+
+        Параллельные промахи по одному ключу ждут единственный вызов loader,
+        а не загружают значение повторно.
+
+        Args:
+            key: Ключ записи
+            loader: Корутина-функция без аргументов, загружающая значение
+            refresh: Игнорировать кеш и загрузить значение заново
+            ttl: Время жизни записи (секунды, по умолчанию self.ttl)
+
+        Returns:
+            Значение из кеша или результат loader
+        """
+        if not refresh:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                # Значение мог загрузить запрос, который держал блокировку
+                value = None if refresh else self.get(key)
+                if value is None:
+                    value = await loader()
+                    self.set(key, value, ttl)
+        finally:
+            # Блокировка удаляется, только когда её не ждёт ни один запрос:
+            # иначе новый запрос создал бы свою и вызвал loader параллельно
+            waiters = self._waiters[key] - 1
+            if waiters:
+                self._waiters[key] = waiters
+            else:
+                del self._waiters[key]
+                del self._locks[key]
+
+        return value
+
+
+__all__ = ["TTLCache"]
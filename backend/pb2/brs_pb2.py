@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: brs.proto
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(
+    b'\n\tbrs.proto\x12\x03\x62rs\"\'\n\x08Response\x12\x1b\n\x06report\x18\x01 \x01(\x0b\x32\x0b.brs.Report\"\\\n\x06Report\x12\x16\n\x04rows\x18\x01 \x03(\x0b\x32\x08.brs.Row\x12\'\n\rcolumn_groups\x18\x02 \x03(\x0b\x32\x10.brs.ColumnGroup\x12\x11\n\tmax_total\x18\x03 \x01(\x03\"Z\n\x03Row\x12#\n\ndiscipline\x18\x01 \x01(\x0b\x32\x0f.brs.Discipline\x12\x1f\n\x06scores\x18\x02 \x03(\x0b\x32\x0f.brs.ScoreEntry\x12\r\n\x05total\x18\x03 \x01(\x01\"(\n\nDiscipline\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\"0\n\nScoreEntry\x12\x13\n\x0b\x63olumn_uuid\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x01\"9\n\x0b\x43olumnGroup\x12\x0c\n\x04type\x18\x01 \x01(\x03\x12\x1c\n\x07\x63olumns\x18\x02 \x03(\x0b\x32\x0b.brs.Column\"L\n\x06\x43olumn\x12\x0c\n\x04uuid\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x11\n\tmax_score\x18\x04 \x01(\x03\x62\x06proto3'
+)
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, "brs_pb2", globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+    DESCRIPTOR._options = None
+    _RESPONSE._serialized_start = 18
+    _RESPONSE._serialized_end = 57
+    _REPORT._serialized_start = 59
+    _REPORT._serialized_end = 151
+    _ROW._serialized_start = 153
+    _ROW._serialized_end = 243
+    _DISCIPLINE._serialized_start = 245
+    _DISCIPLINE._serialized_end = 285
+    _SCOREENTRY._serialized_start = 287
+    _SCOREENTRY._serialized_end = 335
+    _COLUMNGROUP._serialized_start = 337
+    _COLUMNGROUP._serialized_end = 394
+    _COLUMN._serialized_start = 396
+    _COLUMN._serialized_end = 472
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: me_info.proto
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(
+    b'\n\rme_info.proto\x12\x07me_info\")\n\x08Response\x12\x1d\n\x04info\x18\x01 \x01(\x0b\x32\x0f.me_info.MeInfo\"9\n\x06MeInfo\x12\x1b\n\x04user\x18\x01 \x01(\x0b\x32\r.me_info.User\x12\x12\n\nlogout_url\x18\x02 \x01(\t\"\xbe\x01\n\x04User\x12\x0c\n\x04uuid\x18\x01 \x01(\t\x12\x12\n\nfirst_name\x18\x02 \x01(\t\x12\x11\n\tlast_name\x18\x03 \x01(\t\x12\'\n\npatronymic\x18\x04 \x01(\x0b\x32\x13.me_info.Patronymic\x12\x1e\n\x06\x63laims\x18\x05 \x03(\x0b\x32\x0e.me_info.Claim\x12\r\n\x05\x65mail\x18\x06 \x01(\t\x12)\n\x0bpreferences\x18\x07 \x01(\x0b\x32\x14.me_info.Preferences\"\x1b\n\nPatronymic\x12\r\n\x05value\x18\x01 \x01(\t\"$\n\x05\x43laim\x12\x0c\n\x04type\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t\"\x1b\n\x0bPreferences\x12\x0c\n\x04json\x18\x01 \x01(\tb\x06proto3'
+)
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, "me_info_pb2", globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+    DESCRIPTOR._options = None
+    _RESPONSE._serialized_start = 26
+    _RESPONSE._serialized_end = 67
+    _MEINFO._serialized_start = 69
+    _MEINFO._serialized_end = 126
+    _USER._serialized_start = 129
+    _USER._serialized_end = 319
+    _PATRONYMIC._serialized_start = 321
+    _PATRONYMIC._serialized_end = 348
+    _CLAIM._serialized_start = 350
+    _CLAIM._serialized_end = 386
+    _PREFERENCES._serialized_start = 388
+    _PREFERENCES._serialized_end = 415
+# @@protoc_insertion_point(module_scope)
@@ -8,7 +8,7 @@ from backend.attendance import EmailCodeRequiredError, _get_user_schedule
 from backend.database import DBModel
 from backend.mirea_api import get_cookies
 from backend.mirea_api.get_lesson_attendance import get_disciplines, get_visiting_logs
-from backend.schedule_proto import date_to_base64
+from backend.schedule_proto import date_to_grpc_frame
 from backend.schedule_proto.improved_schedule_decoder import parse_schedule
 
 from .schemas import LessonResponse, ScheduleResponse
@@ -33,17 +33,18 @@ async def get_schedules(
         Объект ScheduleResponse со списком занятий
     """
     try:
-        b64_data = date_to_base64(
+        # Запрос и ответ передаются в бинарном виде, без base64 туда и обратно
+        request_frame = date_to_grpc_frame(
             year=year,
             month=month,
             day=day,
         )
 
         user_agent: Optional[str] = await db.get_user_agent(user_id)
-        response: str = await _get_user_schedule(
+        response: bytes = await _get_user_schedule(
             db=db,
             tg_user_id=user_id,
-            b64_data=b64_data,
+            b64_data=request_frame,
             user_agent=user_agent,
         )
 
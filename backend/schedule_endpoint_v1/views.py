@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 from typing import Any, Dict, List, Optional
@@ -107,9 +108,12 @@ async def get_lesson_attendance(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Cookies не найдены"
             )
 
-        # Сначала пытаемся получить количество пар из кеша
-        total_lessons: Optional[int] = (
-            await LessonsCostCache.get_or_fetch_lessons_count(
+        # Количество пар (из кеша или API) и посещаемость запрашиваем
+        # параллельно: время ответа — максимум, а не сумма задержек
+        total_lessons: Optional[int]
+        attendance_data: Optional[Dict[str, Any]]
+        total_lessons, attendance_data = await asyncio.gather(
+            LessonsCostCache.get_or_fetch_lessons_count(
                 db=db,
                 group_name=group_name,
                 subject_name=data.lesson_subject,
@@ -120,19 +124,17 @@ async def get_lesson_attendance(
                 lesson_index_in_day=data.lesson_index_in_day,
                 user_agent=user_agent,
                 tg_user_id=user_id,
-            )
-        )
-
-        # Получаем данные о посещаемости
-        attendance_data: Optional[Dict[str, Any]] = await get_lesson_attendance_info(
-            db=db,
-            tg_user_id=user_id,
-            lesson_date=data.lesson_date,
-            lesson_time=data.lesson_time,
-            lesson_type=data.lesson_type,
-            lesson_subject=data.lesson_subject,
-            lesson_index_in_day=data.lesson_index_in_day,
-            user_agent=user_agent,
+            ),
+            get_lesson_attendance_info(
+                db=db,
+                tg_user_id=user_id,
+                lesson_date=data.lesson_date,
+                lesson_time=data.lesson_time,
+                lesson_type=data.lesson_type,
+                lesson_subject=data.lesson_subject,
+                lesson_index_in_day=data.lesson_index_in_day,
+                user_agent=user_agent,
+            ),
         )
 
         if not attendance_data:
@@ -144,9 +146,9 @@ async def get_lesson_attendance(
         # Преобразуем в формат ответа API
         students: List[StudentAttendance] = [
             StudentAttendance(
-                fio=student["fio"],
-                status=student["status"],
-                status_code=student["status_code"],
+                fio=student.fio,
+                status=student.status,
+                status_code=student.status_code,
             )
             for student in attendance_data["students"]
         ]
@@ -307,7 +309,7 @@ async def get_lessons_calendar_endpoint(
     try:
         await db.connect()
 
-        logger.debug(f"Получение календаря: start_ts={start_ts}, end_ts={end_ts}")
+        logger.debug("Получение календаря: start_ts=%s, end_ts=%s", start_ts, end_ts)
 
         # Получаем данные пользователя
         user: Optional[Dict[str, Any]] = await db.get_user(user_id)
@@ -331,7 +333,7 @@ async def get_lessons_calendar_endpoint(
             logger.warning("Cookies не найдены, возвращаем пустой календарь")
             return LessonsCalendarResponse(calendar={})
 
-        logger.debug(f"Получаем календарь для user_id={user_id}")
+        logger.debug("Получаем календарь для user_id=%s", user_id)
 
         # Используем приватное API для получения календаря
         calendar: Optional[Dict[str, Dict[str, Dict[int, int]]]] = (
@@ -340,15 +342,17 @@ async def get_lessons_calendar_endpoint(
                 user_agent=user_agent,
                 start_ts=start_ts,
                 end_ts=end_ts,
+                tg_user_id=user_id,
             )
         )
 
         if calendar:
-            total_days = sum(
-                len(days) for months in calendar.values() for days in months.values()
-            )
-            logger.debug(f"Получено {total_days} дней с занятиями")
-            logger.debug(f"Годы в календаре: {list(calendar.keys())}")
+            if logger.isEnabledFor(logging.DEBUG):
+                total_days = sum(
+                    len(days) for months in calendar.values() for days in months.values()
+                )
+                logger.debug("Получено %d дней с занятиями", total_days)
+                logger.debug("Годы в календаре: %s", list(calendar))
             return LessonsCalendarResponse(calendar=calendar)
         else:
             logger.debug("Календарь пуст")
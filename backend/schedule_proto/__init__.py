@@ -1,4 +1,4 @@
 from .improved_schedule_decoder import parse_schedule
-from .schedule_request_encoder import date_to_base64
+from .schedule_request_encoder import date_to_base64, date_to_grpc_frame
 
-__all__ = ["date_to_base64", "parse_schedule"]
+__all__ = ["date_to_base64", "date_to_grpc_frame", "parse_schedule"]
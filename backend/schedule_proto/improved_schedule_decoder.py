@@ -8,9 +8,10 @@
 import base64
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 import blackboxprotobuf
+from blackboxprotobuf.lib.exceptions import BlackboxProtobufException
 
 from backend.mirea_api.protobuf_decoder import get_field
 
@@ -288,12 +289,12 @@ def _ensure_list(value: Any) -> List[Any]:
 class ScheduleDecoder:
     """Декодер расписания MIREA с использованием blackboxprotobuf."""
 
-    def __init__(self, b64_data: str):
+    def __init__(self, b64_data: Union[str, bytes]):
         """
         Args:
-            b64_data: Base64-encoded ответ от API
+            b64_data: Ответ от API: raw bytes или base64-encoded строка
         """
-        raw = base64.b64decode(b64_data)
+        raw = b64_data if isinstance(b64_data, bytes) else base64.b64decode(b64_data)
         self.content = skip_grpc_header(raw)
         self._message: Optional[Dict[str, Any]] = None
         self._typedef: Optional[Dict[str, Any]] = None
@@ -311,15 +312,19 @@ class ScheduleDecoder:
                 self._message, self._typedef = blackboxprotobuf.decode_message(
                     self.content, SCHEDULE_TYPEDEF
                 )
-            except Exception as e:
-                logger.warning(f"Ошибка декодирования со схемой: {e}")
+            except BlackboxProtobufException as e:
+                # Без схемы повторяем только при несовпадении данных со схемой
+                logger.warning("Ошибка декодирования со схемой: %s", e)
                 try:
                     self._message, self._typedef = blackboxprotobuf.decode_message(
                         self.content
                     )
                 except Exception as e2:
-                    logger.warning(f"Ошибка декодирования без схемы: {e2}")
+                    logger.warning("Ошибка декодирования без схемы: %s", e2)
                     self._message = {}
+            except Exception as e:
+                logger.warning("Ошибка декодирования расписания: %s", e)
+                self._message = {}
         return self._message
 
     def parse(
@@ -412,13 +417,13 @@ class ScheduleDecoder:
 
 
 def parse_schedule(
-    b64_data: str, disciplines_list: Optional[List[str]] = None
+    b64_data: Union[str, bytes], disciplines_list: Optional[List[str]] = None
 ) -> List[Dict[str, Any]]:
     """
-    Парсит base64 ответ расписания в список занятий.
+    Парсит ответ расписания в список занятий.
 
     Args:
-        b64_data: Base64-encoded строка с ответом от API
+        b64_data: Ответ от API: raw bytes или base64-encoded строка
         disciplines_list: Список полных названий дисциплин для сопоставления
 
     Returns:
@@ -3,9 +3,9 @@ import base64
 from backend.pb2 import schedulerequest_pb2 as request_pb2
 
 
-def date_to_base64(year: int, month: int, day: int) -> str:
+def date_to_grpc_frame(year: int, month: int, day: int) -> bytes:
     """
-    Преобразует дату в base64-строку для запроса расписания через gRPC-Web.
+    Собирает gRPC-Web фрейм запроса расписания на дату.
 
     Args:
         year: Год
@@ -13,7 +13,7 @@ def date_to_base64(year: int, month: int, day: int) -> str:
         day: День
 
     Returns:
-        Base64-encoded строка с protobuf сообщением в gRPC-Web формате
+        Protobuf сообщение в gRPC-Web формате
     """
     # Собираем protobuf-пейлоад
     request = request_pb2.Request()
@@ -28,6 +28,19 @@ def date_to_base64(year: int, month: int, day: int) -> str:
     # gRPC(-Web) фрейм: 1 байт флагов + 4 байта длины (big-endian) + payload
     flags = bytes([0])  # 0 = без компрессии
     length = len(payload).to_bytes(4, byteorder="big")  # big-endian
-    framed = flags + length + payload
+    return flags + length + payload
+
+
+def date_to_base64(year: int, month: int, day: int) -> str:
+    """
+    Преобразует дату в base64-строку для запроса расписания через gRPC-Web.
 
-    return base64.b64encode(framed).decode("utf-8")
+    Args:
+        year: Год
+        month: Месяц
+        day: День
+
+    Returns:
+        Base64-encoded строка с protobuf сообщением в gRPC-Web формате
+    """
+    return base64.b64encode(date_to_grpc_frame(year, month, day)).decode("utf-8")